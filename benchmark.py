@@ -0,0 +1,195 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from model import HREmployeeAttritionModel, UNUSED_COLS, CLASSIFIERS, EVALUATION_POLICIES
+from model.synthetic import synthesize_hr_data
+from view.figures import visualize_classifier, OUTPUT_FORMATS
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+BENCHMARK_VERSION = 1
+DEFAULT_SIZES = [1470, 14700]
+DEFAULT_TOLERANCE = 1.2
+
+
+class StageTimer(object):
+    """
+    Measures the wall-clock and the peak python memory of stages
+    """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        # Tracing may already be on for HR_INSTRUMENTATION=memory, then it is left on and only its peak is reset
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            result = {"seconds": time.perf_counter() - start}
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                result["peak_memory_mb"] = (peak - traced_start) / 2 ** 20
+            self.stages[name] = result
+
+
+def get_environment():
+    import numpy
+    import pandas
+    import sklearn
+    import xgboost
+
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "numpy": numpy.__version__, "pandas": pandas.__version__, "sklearn": sklearn.__version__,
+            "xgboost": xgboost.__version__}
+
+
+def benchmark_size(n_rows, n_jobs, classifier_names, output_format, trace_memory, seed, evaluation):
+    """
+    Benchmark training, predicting and visualizing a model over a synthetic dataset of n_rows employees
+    """
+    timer = StageTimer(trace_memory)
+    # Trained without evaluating, so the evaluation is timed once by its own stage
+    model = HREmployeeAttritionModel(n_jobs=n_jobs, classifier_names=classifier_names, evaluation="off")
+    for col in UNUSED_COLS:
+        del model.hr_retention_data[col]
+    with timer.stage("synthesize"):
+        model.hr_retention_data = synthesize_hr_data(model.hr_retention_data, n_rows, seed)
+
+    with timer.stage("train"):
+        model.train()
+    classifiers = {model_name: {"fit": model.timings[f"fit_{model_name}"]["wall"]}
+                   for model_name in model.classifiers}
+
+    model.evaluation = evaluation
+    for model_name, classifier in model.classifiers.items():
+        with timer.stage(f"log_train_res_{model_name}"):
+            model.log_train_res(classifier, model_name)
+            model.wait_for_evaluation()
+        classifiers[model_name]["log_train_res"] = timer.stages.pop(f"log_train_res_{model_name}")["seconds"]
+    timer.stages["log_train_res"] = {"seconds": sum(classifier["log_train_res"]
+                                                    for classifier in classifiers.values())}
+
+    with timer.stage("predict"):
+        # A copy of the test set, so the predictions cached by the evaluation are not reused
+        model.predict(model.x_test.copy())
+    for model_name in model.classifiers:
+        classifiers[model_name]["predict"] = model.timings[f"predict_{model_name}"]["wall"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        with timer.stage("visualize_classifier"):
+            visualize_classifier(model, os.path.join(directory, "plots"), output_format,
+                                 cache_dir=os.path.join(directory, "cache"))
+
+    return {"rows": n_rows, "test_rows": len(model.x_test), "stages": timer.stages, "classifiers": classifiers,
+            "memory_mb": model.get_memory_footprint()}
+
+
+def run_benchmark(sizes, n_jobs=1, classifier_names=None, output_format="png", trace_memory=True, seed=0,
+                  evaluation="full"):
+    """
+    Benchmark the pipeline over synthetic datasets of the given sizes
+    """
+    results = []
+    for n_rows in sizes:
+        print(f"Benchmarking {n_rows} employees...")
+        results.append(benchmark_size(n_rows, n_jobs, classifier_names, output_format, trace_memory, seed,
+                                      evaluation))
+    return {"version": BENCHMARK_VERSION, "environment": get_environment(),
+            "settings": {"n_jobs": n_jobs, "classifiers": classifier_names or list(CLASSIFIERS),
+                         "output_format": output_format, "seed": seed, "evaluation": evaluation},
+            # ru_maxrss is in KB on Linux
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10 if resource else None,
+            "results": results}
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the times of a benchmark to a baseline, returns the stages that are slower by more than tolerance
+    """
+    regressions = []
+    baseline_results = {result["rows"]: result for result in baseline["results"]}
+    for result in current["results"]:
+        if result["rows"] not in baseline_results:
+            continue
+        baseline_result = baseline_results[result["rows"]]
+        times = {stage: val["seconds"] for stage, val in result["stages"].items()}
+        baseline_times = {stage: val["seconds"] for stage, val in baseline_result["stages"].items()}
+        for model_name, classifier_times in result["classifiers"].items():
+            for stage, seconds in classifier_times.items():
+                times[f"{model_name}.{stage}"] = seconds
+        for model_name, classifier_times in baseline_result["classifiers"].items():
+            for stage, seconds in classifier_times.items():
+                baseline_times[f"{model_name}.{stage}"] = seconds
+
+        for stage, seconds in times.items():
+            if stage not in baseline_times or not baseline_times[stage]:
+                continue
+            ratio = seconds / baseline_times[stage]
+            mark = "REGRESSION" if ratio > tolerance else ""
+            print(f"{result['rows']:>10} {stage:<50} {baseline_times[stage]:10.3f}s {seconds:10.3f}s "
+                  f"{ratio:6.2f}x {mark}")
+            if ratio > tolerance:
+                regressions.append((result["rows"], stage, ratio))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark training, predicting and visualizing over synthetic "
+                                                 "HR datasets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of employees")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of cores to use (-1 means all the cores)")
+    parser.add_argument("--classifiers", nargs="+", choices=list(CLASSIFIERS), help="Classifiers to use (all of "
+                                                                                    "them by default)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="png", help="Output format of the figures")
+    parser.add_argument("--no-memory", action="store_true", help="Do not measure memory (it slows the stages)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic datasets")
+    parser.add_argument("--evaluation", choices=EVALUATION_POLICIES, default="full",
+                        help="How to evaluate the classifiers after training them")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to save the results to")
+    parser.add_argument("--compare", help="JSON file of a baseline to compare the results to")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Stages slower than the baseline by more than this ratio are regressions")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.WARNING)
+    benchmark = run_benchmark(args.sizes, args.n_jobs, args.classifiers, args.output_format, not args.no_memory,
+                              args.seed, args.evaluation)
+    with open(args.output, "w") as f:
+        json.dump(benchmark, f, indent=2)
+    for size_result in benchmark["results"]:
+        for stage_name, stage in size_result["stages"].items():
+            print(f"{size_result['rows']:>10} {stage_name:<25} {stage['seconds']:10.3f}s "
+                  f"{stage.get('peak_memory_mb', 0):10.1f}MB")
+    print(f"Saved the results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            found_regressions = compare(json.load(f), benchmark, args.tolerance)
+        if found_regressions:
+            print(f"Found {len(found_regressions)} regressions")
+            sys.exit(1)
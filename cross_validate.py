@@ -0,0 +1,41 @@
+import argparse
+import json
+import logging
+
+from model import HREmployeeAttritionModel, UNUSED_COLS, VOTING_TYPES
+from model.compiled import CompiledModel
+from model.crossval import DEFAULT_FOLDS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cross validate the classifiers of the model over k folds")
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS, help="Number of folds")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="Number of cores to use, folds run at the same time (-1 means all the cores)")
+    parser.add_argument("--voting", choices=VOTING_TYPES, default="hard",
+                        help="hard for a majority vote of the classifiers, soft for averaging their probabilities")
+    parser.add_argument("--output", default="cross_validation.json", help="JSON file to save the metrics to")
+    parser.add_argument("--compiled", help="Compile the classifiers of all the folds as a single ensemble to this file")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    model = HREmployeeAttritionModel(n_jobs=args.n_jobs, voting=args.voting)
+    for col in UNUSED_COLS:
+        del model.hr_retention_data[col]
+    folds = model.cross_validate(args.folds, use_fold_models=bool(args.compiled))
+    with open(args.output, "w") as f:
+        json.dump({"folds": folds, "summary": {name: metrics["cross_validation"]
+                                               for name, metrics in model.metrics.items()}}, f, indent=2)
+
+    print(f"{'accuracy':>16} {'f1':>16} {'auc':>16}  classifier")
+    for model_name, metrics in model.metrics.items():
+        summary = metrics["cross_validation"]
+        print("".join(f"{summary[name]['mean']:9.3f}+-{summary[name]['std']:.3f}" if name in summary else f"{'':>16}"
+                      for name in ["accuracy", "f1", "auc"]) + f"  {model_name}")
+    print(f"Saved the metrics to {args.output}")
+    if args.compiled:
+        CompiledModel.from_model(model).save(args.compiled)
+        print(f"Compiled the classifiers of all the folds to {args.compiled}")
@@ -0,0 +1,39 @@
+import argparse
+import json
+import logging
+
+from model.drift import DEFAULT_DRIFT_STATE, DriftMonitor, log_report
+
+
+def merge_states(paths):
+    """
+    Merge the drift monitors saved by several scoring processes into one
+    """
+    monitor = DriftMonitor.load(paths[0])
+    for path in paths[1:]:
+        monitor.merge(DriftMonitor.load(path))
+    return monitor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Report the drift of the scored employees from the HR data")
+    parser.add_argument("states", nargs="*", default=[DEFAULT_DRIFT_STATE],
+                        help="Files of drift monitors saved by score.py or service.py, they are merged")
+    parser.add_argument("--merged", help="File to save the merged monitor to")
+    parser.add_argument("--output", help="JSON file to write the report to")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    drift_monitor = merge_states(args.states)
+    report = drift_monitor.report()
+    for col, feature in sorted(report["features"].items(), key=lambda item: -item[1]["psi"]):
+        logging.info(f"{col}: " + ", ".join(f"{name} {val:.3f}" for name, val in feature.items()))
+    log_report(report)
+    if args.merged:
+        drift_monitor.save(args.merged)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
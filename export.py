@@ -0,0 +1,32 @@
+import argparse
+import logging
+import time
+
+from model import VOTING_TYPES
+from model.compiled import compile_model
+from model.registry import DEFAULT_REGISTRY_DIR
+from score import get_trained_model
+
+DEFAULT_OUTPUT = "model.npz"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compile the trained model to a single file that predicts with "
+                                                 "numpy only")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="File to save the compiled model to (.npz)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of cores to train with (-1 means all the cores)")
+    parser.add_argument("--voting", choices=VOTING_TYPES, default="hard",
+                        help="hard for a majority vote of the classifiers, soft for averaging their probabilities")
+    parser.add_argument("--ensemble", help="JSON config of the ensemble (see ensemble.json), its voting is used "
+                                           "over --voting")
+    parser.add_argument("--registry-dir", default=DEFAULT_REGISTRY_DIR, help="Directory of the trained models")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    model = get_trained_model(args.n_jobs, args.registry_dir, args.voting, ensemble=args.ensemble)
+    start = time.perf_counter()
+    compile_model(model, args.output)
+    logging.info(f"Compiled the model to {args.output} in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,56 @@
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+DEFAULT_MODULES = ["view.hr_app", "score", "model.registry"]
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(module):
+    """
+    Import a module in a new interpreter with -X importtime.
+    Returns the self and cumulative import time (in seconds) of every module it imported, in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError(f"Failed importing {module}:\n{result.stderr}")
+
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            times.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return times
+
+
+def print_breakdown(module, top=15):
+    """
+    Print the import time of a module, by top level package and by the slowest modules
+    """
+    times = measure_imports(module)
+    total = sum(self_time for _, self_time, _ in times)
+    by_package = defaultdict(float)
+    for name, self_time, _ in times:
+        by_package[name.split(".")[0]] += self_time
+
+    print(f"Importing {module} took {total:.3f}s ({len(times)} modules)")
+    print("By package:")
+    for package, package_time in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<30} {package_time:8.3f}s {package_time / total:6.1%}")
+    print("Slowest modules (self time):")
+    for name, self_time, cumulative_time in sorted(times, key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:<50} {self_time:8.3f}s (cumulative {cumulative_time:.3f}s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the import time of the app's modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to measure")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages and modules to print")
+    args = parser.parse_args()
+    for module_name in args.modules:
+        print_breakdown(module_name, args.top)
+        print()
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from model import DATA_PATH, UNUSED_COLS
+from model.dataset import load_data
+from service import HOST, DEFAULT_PORT
+
+
+async def post(reader, writer, path, body):
+    """
+    Send a request over a kept-alive connection, returns the status and the JSON body of the response
+    """
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, val = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(val)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(port, bodies, latencies, statuses):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            status, _ = await post(reader, writer, "/predict", body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_test(port, clients, requests_per_client):
+    """
+    Send the employees of the HR data to the service from concurrent clients, prints the latencies and throughput
+    """
+    data = load_data(DATA_PATH).drop(columns=UNUSED_COLS + ["Attrition"])
+    records = [json.dumps({col: val.item() if hasattr(val, "item") else val for col, val in row.items()}).encode()
+               for row in data.to_dict("records")]
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*[client(port, [records[(i * requests_per_client + j) % len(records)]
+                                         for j in range(requests_per_client)], latencies, statuses)
+                           for i in range(clients)])
+    total = time.perf_counter() - start
+    latencies = np.asarray(latencies) * 1000
+    print(f"{len(latencies)} requests from {clients} clients in {total:.3f}s ({len(latencies) / total:.0f} requests/s)")
+    print(f"Statuses: {statuses}")
+    print(f"Latency: p50 {np.percentile(latencies, 50):.1f}ms, p90 {np.percentile(latencies, 90):.1f}ms, "
+          f"p99 {np.percentile(latencies, 99):.1f}ms, max {latencies.max():.1f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the scoring service on localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port the service listens on")
+    parser.add_argument("--clients", type=int, default=50, help="Number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="Number of requests of every client")
+    args = parser.parse_args()
+    asyncio.run(load_test(args.port, args.clients, args.requests))
@@ -1,25 +1,59 @@
+import copy
+import hashlib
+import importlib
 import logging
 import os
-from collections import Counter
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, BaggingClassifier
-from sklearn.metrics import accuracy_score
-from sklearn.model_selection import train_test_split
-from sklearn.neighbors import KNeighborsClassifier
-from xgboost import XGBClassifier
-
-COLS_TO_ENCODE = {
-    "Attrition": {},
-    "BusinessTravel": {},
-    "Department": {},
-    "EducationField": {},
-    "Gender": {},
-    "JobRole": {},
-    "MaritalStatus": {},
-    "Over18": {},
-    "OverTime": {}
+
+from model.attribution import MAX_CACHED_ATTRIBUTIONS, MAX_CACHED_ROWS, TreeExplainer, is_explainable, to_frame
+from model.cascade import DEFAULT_CASCADE_ACCURACY_DROP, calibrate_cascade, get_cascade_settings
+from model.dataset import load_data, downcast, memory_mb
+from model.crossval import DEFAULT_FOLDS, cross_validate
+from model.encoder import CategoricalEncoder, UNKNOWN_CODE
+from model.evaluation import EVALUATION_POLICIES, DEFAULT_EVALUATION_ROWS, get_background_executor, predict_scores, \
+    get_metrics, subsample, log_metrics
+from model.incremental import DEFAULT_FULL_TRAIN_EVERY, DEFAULT_MAX_ACCURACY_DROP, warm_start_classifier
+from model.instrumentation import span, record, get_rss_mb
+from model.parallel import get_n_jobs, split_n_jobs, set_n_jobs, fit_in_processes, predict_in_threads, log_timing
+
+UNUSED_COLS = ["EmployeeNumber", "EmployeeCount", "Over18"]
+VOTING_TYPES = ["hard", "soft"]
+# The classifiers of the ensemble by their names: the module and class of each classifier and its parameters,
+# the modules are imported only when a classifier is created
+CLASSIFIERS = {
+    "RandomForestClassifier_Gini": ("sklearn.ensemble", "RandomForestClassifier",
+                                    {"n_estimators": 500, "criterion": "gini"}),
+    "RandomForestClassifier_Entropy": ("sklearn.ensemble", "RandomForestClassifier",
+                                       {"n_estimators": 500, "criterion": "entropy"}),
+    "KNeighborsClassifier": ("model.neighbors", "ScaledKNeighborsClassifier", {}),
+    "BaggingClassifier": ("sklearn.ensemble", "BaggingClassifier", {"n_estimators": 1000}),
+    "XGBClassifier": ("xgboost", "XGBClassifier", {"n_estimators": 1000, "max_depth": 3})
 }
+DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "HR-Employee-Attrition.csv")
+
+
+def create_classifier(module, class_name, params):
+    """
+    Create a classifier, its module is imported only now
+    """
+    return getattr(importlib.import_module(module), class_name)(**params)
+
+
+def weighted_vote(predictions, weights):
+    """
+    Get the weighted majority vote of a list of predictions.
+    Returns the predictions and the weighted share of the predictions that voted for them.
+    """
+    votes = np.vstack([np.asarray(prediction) for prediction in predictions])
+    classes = np.unique(votes)
+    counts = np.stack([weights @ (votes == cls) for cls in classes])
+    top = counts.argmax(axis=0)
+    return classes[top], counts.max(axis=0) / weights.sum()
 
 
 class HREmployeeAttritionModel(object):
@@ -27,52 +61,95 @@ class HREmployeeAttritionModel(object):
     Class that will train over the HR data
     """
     COLS_INDEXES = {}
+    TRAINED_ATTRIBUTES = ["x_cols", "encoder", "classifiers", "x_train", "x_test", "y_train", "y_test",
+                          "incremental_updates", "metrics", "test_scores", "cascade"]
+    STATE_VERSION = 5
 
-    def __init__(self):
+    def __init__(self, n_jobs=1, voting="hard", weights=None, classifier_names=None, evaluation="test",
+                 evaluation_rows=DEFAULT_EVALUATION_ROWS, classifier_specs=None, latency_budgets=None,
+                 cascade_accuracy_drop=DEFAULT_CASCADE_ACCURACY_DROP):
+        """
+        n_jobs is the number of cores the classifiers may use together (-1 means all the cores),
+        with more than 1 the classifiers are trained and predict at the same time.
+        voting is "hard" for a majority vote of the classifiers or "soft" for averaging their probabilities,
+        weights are the weights of the classifiers by their names in both (1 by default).
+        classifier_names are the names of the classifiers (in classifier_specs) to use, all of them by default.
+        evaluation is how the classifiers are evaluated after training (one of EVALUATION_POLICIES), only over the
+        test set by default ("full" evaluates over the train set too, like before the policies),
+        evaluation_rows is the number of rows of each set that subsample evaluates over.
+        classifier_specs are the classifiers to choose from in the format of CLASSIFIERS (see model.ensemble to load
+        them from a config file), CLASSIFIERS by default.
+        latency_budgets are the most milliseconds the classifiers may take to predict an employee by their names,
+        the classifiers over their budgets are consulted only when the others are not confident enough, so at most
+        cascade_accuracy_drop of the test set is predicted differently than by all of them (see model.cascade).
+        """
+        if voting not in VOTING_TYPES:
+            raise ValueError(f"Unknown voting '{voting}', should be one of: {VOTING_TYPES}")
+        if evaluation not in EVALUATION_POLICIES:
+            raise ValueError(f"Unknown evaluation '{evaluation}', should be one of: {EVALUATION_POLICIES}")
+        self.evaluation = evaluation
+        self.evaluation_rows = evaluation_rows
+        self.voting = voting
+        self.weights = weights or {}
         self._number_of_employees = 0
         self.hr_retention_data = self._get_hr_retention_data()
         self.x_cols = []
-        self.reversed_mappings = {}
-
-        self.classifiers = {
-            "RandomForestClassifier_Gini": RandomForestClassifier(n_estimators=500, criterion="gini"),
-            "RandomForestClassifier_Entropy": RandomForestClassifier(n_estimators=500, criterion="entropy"),
-            "KNeighborsClassifier": KNeighborsClassifier(),
-            "BaggingClassifier": BaggingClassifier(n_estimators=1000),
-            "XGBClassifier": XGBClassifier(n_estimators=1000, max_depth=3)
-        }
+        self.encoder = CategoricalEncoder()
+
+        self.classifier_specs = classifier_specs or CLASSIFIERS
+        classifier_names = classifier_names or list(self.classifier_specs)
+        self.classifiers = {model_name: create_classifier(*self.classifier_specs[model_name])
+                            for model_name in classifier_names}
+        self.latency_budgets = latency_budgets or {}
+        self.cascade_accuracy_drop = cascade_accuracy_drop
         self.x_train, self.x_test, self.y_train, self.y_test = None, None, None, None
+        self.timings = {}
+        self.incremental_updates = 0
+        # Metrics of every classifier by its name, and its scores over the test set that predicting it reuses
+        self.metrics = {}
+        self.test_scores = {}
+        self._evaluations = {}
+        self._fill_values = None
+        # Explainers of the tree classifiers and the attributions of recently explained data, until training again
+        self._explainers = {}
+        self._attributions = OrderedDict()
+        # Stages of cascade inference, calibrated after training when there are latency budgets
+        self.cascade = None
+        # Called with a message on every step of training and predicting, it may raise to stop them
+        self.progress = None
+        self.set_n_jobs(n_jobs)
+
+    def set_n_jobs(self, n_jobs):
+        """
+        Set the number of cores the classifiers may use together and split them between the classifiers
+        """
+        self.n_jobs = get_n_jobs(n_jobs)
+        self._workers, self._classifiers_n_jobs = split_n_jobs(self.classifiers, self.n_jobs)
+        for model_name, model in self.classifiers.items():
+            set_n_jobs(model, self._classifiers_n_jobs[model_name])
+
+    def _report_progress(self, message):
+        if self.progress:
+            self.progress(message)
 
     def _get_hr_retention_data(self):
-        path_to_data = os.path.join(os.path.dirname(__file__), "data", "HR-Employee-Attrition.csv")
-        data = pd.read_csv(path_to_data).fillna(0)
+        data = load_data(DATA_PATH)
         self._number_of_employees = len(data)
         return data
 
     def _get_fitted_data(self):
-        data = self.hr_retention_data.copy(deep=True)
-
-        for col in self.hr_retention_data.columns:
-            col_data = data[col].astype(str)
-            col_data = set(col_data.tolist())
-            reverse_mapping = {i: val for val, i in zip(col_data, range(len(col_data)))}
-            self.reversed_mappings[col] = reverse_mapping
-
-        for col in COLS_TO_ENCODE:
-            if col in data.columns:
-                col_data = data[col].astype(str)
-                col_data = set(col_data.tolist())
-                logging.info(f"{col}: {col_data}")
-                mapping = {val: i for val, i in zip(col_data, range(len(col_data)))}
-                COLS_TO_ENCODE[col] = mapping
-                data[col] = data[col].map(mapping)
+        with span("get_fitted_data"):
+            self.encoder.fit(self.hr_retention_data)
+            for col, categories in self.encoder.categories.items():
+                logging.info(f"{col}: {categories}")
+            return self.encoder.transform(self.hr_retention_data)
 
-        return data
-
-    def train(self):
+    def split_data(self):
         """
-        Train the model
+        Encode the HR data and split it to the train and test sets, returns the whole encoded features and labels
         """
+        from sklearn.model_selection import train_test_split
+
         HREmployeeAttritionModel.COLS_INDEXES = {col: 0
                                                  for col in self.hr_retention_data.columns
                                                  if col != "Attrition"}
@@ -88,57 +165,527 @@ class HREmployeeAttritionModel(object):
                 HREmployeeAttritionModel.COLS_INDEXES[col] = list(self.hr_retention_data.columns).index(col) - 1
 
         self.x_cols = [col for col in self.hr_retention_data.columns if col != "Attrition"]
+        self._fill_values = None
         fitted_data = self._get_fitted_data()
         x = fitted_data[self.x_cols]
         y = fitted_data["Attrition"]
         self.x_train, self.x_test, self.y_train, self.y_test = train_test_split(x, y, test_size=0.2, random_state=999)
-        for model_name, model in self.classifiers.items():
-            logging.info(f"Training model: {model_name}")
-            model.fit(self.x_train, self.y_train)
-            logging.info(f"Training is done")
-            self.log_train_res(model, model_name)
+        return x, y
+
+    def get_memory_footprint(self):
+        """
+        Get the memory of the HR data and of the train and test sets in MB, and the resident memory of the process
+        """
+        footprint = {"data": memory_mb(self.hr_retention_data)}
+        for name in ["x_train", "x_test", "y_train", "y_test"]:
+            if getattr(self, name) is not None:
+                footprint[name] = memory_mb(getattr(self, name))
+        footprint["rss"] = get_rss_mb()
+        return footprint
+
+    def log_memory_footprint(self):
+        footprint = self.get_memory_footprint()
+        logging.info("Memory footprint: " + ", ".join(f"{name} {val:.2f}MB" for name, val in footprint.items()
+                                                      if val is not None))
+
+    def train(self):
+        """
+        Train the model
+        """
+        self.split_data()
+        self.incremental_updates = 0
+        self._clear_metrics()
+        if self._workers > 1:
+            self._train_in_parallel()
+        else:
+            for i, (model_name, model) in enumerate(self.classifiers.items()):
+                logging.info(f"Training model: {model_name}")
+                self._report_progress(f"Training {model_name} ({i + 1}/{len(self.classifiers)})")
+                start_wall, start_cpu = time.perf_counter(), time.process_time()
+                with span("fit", classifier=model_name):
+                    model.fit(self.x_train, self.y_train)
+                self.timings[f"fit_{model_name}"] = log_timing(model_name, "Training",
+                                                               time.perf_counter() - start_wall,
+                                                               time.process_time() - start_cpu,
+                                                               self._classifiers_n_jobs[model_name])
+                logging.info(f"Training is done")
+                self.log_train_res(model, model_name)
+        self.log_memory_footprint()
+        self._calibrate_cascade()
+
+    def cross_validate(self, folds=DEFAULT_FOLDS, use_fold_models=False):
+        """
+        Train and evaluate the classifiers on every fold of a k-fold cross validation, the folds run at the same
+        time when n_jobs allows it. The metrics of every classifier and of their vote are added to the metrics
+        as "cross_validation", with their mean and standard deviation over the folds.
+        The folds are of the train set only, so the test set stays unseen by the classifiers of every fold.
+        With use_fold_models the classifiers of all the folds replace the classifiers of the model and vote
+        together, so the model is trained without training it again.
+        Returns the metrics of every fold.
+        """
+        self.split_data()
+        self._report_progress(f"Cross validating {len(self.classifiers)} models over {folds} folds")
+        with span("cross_validate", folds=folds):
+            result = cross_validate(self.classifiers, self.x_train.to_numpy(dtype=float), self.y_train.to_numpy(),
+                                    self.x_cols, self._get_weights(self.classifiers), self.voting, folds,
+                                    self.n_jobs)
+        self._clear_metrics()
+        for model_name, summary in result["summary"].items():
+            self.metrics[model_name] = {"cross_validation": summary}
+            logging.info(f"Cross validation of {model_name}: " +
+                         ", ".join(f"{name} {val['mean']:.3f} (+-{val['std']:.3f})" for name, val in summary.items()))
+
+        if use_fold_models:
+            self.incremental_updates = 0
+            self.classifiers = {f"{model_name}_fold{fold + 1}": model
+                                for fold, fold_classifiers in enumerate(result["classifiers"])
+                                for model_name, model in fold_classifiers.items()}
+            # The classifiers of every fold have the weights of the classifiers they were cloned from
+            self.weights = {f"{model_name}_fold{fold + 1}": weight
+                            for fold in range(folds) for model_name, weight in self.weights.items()}
+            self.set_n_jobs(self.n_jobs)
+        return result["folds"]
+
+    def _train_in_parallel(self):
+        logging.info(f"Training {len(self.classifiers)} models with {self._workers} workers "
+                     f"and {self.n_jobs} jobs: {self._classifiers_n_jobs}")
+        trained = fit_in_processes(self.classifiers, self.x_train, self.y_train, self._workers)
+        for i, (model_name, model, wall, cpu) in enumerate(trained):
+            self.classifiers[model_name] = model
+            # Fitted in another process, so only its measured time is recorded
+            record("fit", wall, classifier=model_name)
+            self.timings[f"fit_{model_name}"] = log_timing(model_name, "Training", wall, cpu,
+                                                           self._classifiers_n_jobs[model_name])
+            self._report_progress(f"Trained {model_name} ({i + 1}/{len(self.classifiers)})")
+        logging.info(f"Training is done")
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            list(executor.map(self.log_train_res, self.classifiers.values(), self.classifiers.keys()))
 
     def predict(self, data):
         """
         Predict from given data
         """
-        predictions = []
-        end_predictions = []
-        for model_name, model in self.classifiers.items():
-            logging.info(f"Predicting with model: {model_name}")
-            prediction = model.predict(data)
-            predictions.append(prediction)
-            logging.info(f"Predicted: {prediction}")
+        return self.predict_with_votes(data)[0]
+
+    def predict_with_confidence(self, data):
+        """
+        Predict from given data, returns the predictions and the confidence of every prediction
+        """
+        predictions, confidence, _ = self.predict_with_votes(data)
+        return predictions, confidence
 
-        num_of_classifiers = len(self.classifiers)
+    def predict_with_votes(self, data):
+        """
+        Predict from given data with a single pass over the classifiers.
+        Returns the predictions, the confidence of every prediction and the votes of every classifier.
+        With latency budgets the classifiers over them predict only the employees the others are not confident
+        about, and their votes for the other employees are UNKNOWN_CODE.
+        """
+        # The test set is predicted by all the classifiers, it calibrates the cascade and its scores are cached
+        cascade = None if data is self.x_test else self.get_cascade()
+        if cascade is None or not cascade["deferred"]:
+            outputs = self._predict_with_classifiers(data, self._voting_method)
+            predictions, confidence = self.combine(outputs)
+            return predictions, confidence, self._get_votes(outputs)
 
-        for i in range(len(predictions[0])):
-            preds = [predictions[j][i] for j in range(num_of_classifiers)]
-            counted_predictions = Counter(preds)
-            top_prediction = max(counted_predictions, key=counted_predictions.get)
-            end_predictions.append(top_prediction)
-        return end_predictions
+        # The first classifiers always give their probabilities, the cascade is gated by them with hard voting too
+        probas = self._predict_with_classifiers(data, "predict_proba", cascade["first"])
+        outputs = probas if self.voting == "soft" else self._get_votes(probas, "predict_proba")
+        predictions, confidence = self.combine(outputs)
+        votes = self._get_votes(outputs)
+        uncertain = self.get_probability_of(probas, predictions) < cascade["threshold"]
+        for model_name in cascade["deferred"]:
+            votes[model_name] = np.full(len(predictions), UNKNOWN_CODE, dtype=predictions.dtype)
+        if uncertain.any():
+            rows = data[uncertain] if isinstance(data, pd.DataFrame) else np.asarray(data)[uncertain]
+            deferred_outputs = self._predict_with_classifiers(rows, self._voting_method, cascade["deferred"])
+            outputs = {model_name: output[uncertain] for model_name, output in outputs.items()}
+            outputs.update(deferred_outputs)
+            predictions[uncertain], confidence[uncertain] = self.combine(outputs)
+            for model_name, vote in self._get_votes(deferred_outputs).items():
+                votes[model_name][uncertain] = vote
+        return predictions, confidence, {model_name: votes[model_name] for model_name in self.classifiers}
+
+    def combine(self, outputs):
+        """
+        Combine the predictions (or probabilities with soft voting) of classifiers by their names,
+        returns the predictions and their confidence
+        """
+        return self.average_probas(outputs) if self.voting == "soft" else self.vote(outputs)
+
+    @property
+    def _voting_method(self):
+        return "predict_proba" if self.voting == "soft" else "predict"
+
+    def _get_votes(self, outputs, method=None):
+        if (method or self._voting_method) == "predict_proba":
+            return {model_name: self.classes[proba.argmax(axis=1)] for model_name, proba in outputs.items()}
+        return dict(outputs)
+
+    def get_probability_of(self, probas, predictions):
+        """
+        Get the weighted average probability the classifiers gave to the predictions
+        """
+        average = self._average(probas)
+        return average[np.arange(len(predictions)), np.searchsorted(self.classes, predictions)]
+
+    def _calibrate_cascade(self):
+        self.cascade = None
+        if self.latency_budgets:
+            with span("calibrate_cascade"):
+                self.cascade = calibrate_cascade(self, self.latency_budgets, self.cascade_accuracy_drop)
+
+    def get_cascade(self):
+        """
+        Get the stages of cascade inference (see model.cascade.calibrate_cascade), None without latency budgets or
+        before training. The cascade is calibrated after training and stored with the model, and again only if it
+        was calibrated for other budgets.
+        """
+        if not self.latency_budgets or self.x_test is None:
+            return None
+        if self.cascade is None or self.cascade["settings"] != get_cascade_settings(self):
+            logging.info("Calibrating the cascade for the latency budgets of this model")
+            self._calibrate_cascade()
+        return self.cascade
+
+    def predict_votes(self, data):
+        """
+        Predict with every classifier, returns the predictions of every classifier by its name
+        """
+        return self._predict_with_classifiers(data, "predict")
+
+    def predict_probas(self, data):
+        """
+        Predict the probabilities of the classes with every classifier, returns them by the name of the classifier
+        """
+        return self._predict_with_classifiers(data, "predict_proba")
+
+    def _get_cached_predictions(self, data, method):
+        """
+        Get the predictions of the classifiers that were evaluated over the test set, when data is the test set
+        """
+        if data is not self.x_test:
+            return {}
+        cached = {}
+        for model_name, scores in list(self.test_scores.items()):
+            if method == "predict_proba" and scores.ndim == 2:
+                cached[model_name] = scores
+            elif method == "predict":
+                cached[model_name] = self.classes[scores.argmax(axis=1)] if scores.ndim == 2 else scores
+        if cached:
+            logging.info(f"Reusing the test predictions of: {list(cached)}")
+        return cached
+
+    def _predict_with_classifiers(self, data, method, model_names=None):
+        model_names = model_names or list(self.classifiers)
+        predictions = self._get_cached_predictions(data, method)
+        classifiers = {model_name: self.classifiers[model_name] for model_name in model_names
+                       if model_name not in predictions}
+        if classifiers and self._workers > 1:
+            self._report_progress(f"Predicting with {len(classifiers)} models")
+            start_cpu = time.process_time()
+            results = predict_in_threads(classifiers, data, self._workers, method)
+            for model_name, (prediction, wall, cpu) in results.items():
+                record(method, wall, classifier=model_name)
+                self.timings[f"{method}_{model_name}"] = log_timing(model_name, "Predicting", wall, cpu,
+                                                                    self._classifiers_n_jobs[model_name])
+                predictions[model_name] = prediction
+                logging.info(f"Predicted: {prediction}")
+            # Unlike the cpu time of every classifier, this counts the threads the classifiers started themselves
+            logging.info(f"Predicting cpu time: {time.process_time() - start_cpu:.3f}s")
+        else:
+            for model_name, model in classifiers.items():
+                logging.info(f"Predicting with model: {model_name}")
+                self._report_progress(f"Predicting with {model_name}")
+                start_wall, start_cpu = time.perf_counter(), time.process_time()
+                with span(method, classifier=model_name):
+                    prediction = getattr(model, method)(data)
+                self.timings[f"{method}_{model_name}"] = log_timing(model_name, "Predicting",
+                                                                    time.perf_counter() - start_wall,
+                                                                    time.process_time() - start_cpu,
+                                                                    self._classifiers_n_jobs[model_name])
+                predictions[model_name] = prediction
+                logging.info(f"Predicted: {prediction}")
+        return {model_name: predictions[model_name] for model_name in model_names}
+
+    @property
+    def classes(self):
+        """
+        The classes the classifiers were trained on
+        """
+        return next(iter(self.classifiers.values())).classes_
+
+    def _get_weights(self, model_names):
+        return np.asarray([self.weights.get(model_name, 1.0) for model_name in model_names], dtype=float)
+
+    def vote(self, predictions):
+        """
+        Get the weighted majority vote of the predictions of the classifiers.
+        Returns the predictions and the weighted share of the classifiers that voted for them.
+        """
+        return weighted_vote(predictions.values(), self._get_weights(predictions))
+
+    def average_probas(self, probas):
+        """
+        Get the weighted average of the probabilities of the classifiers.
+        Returns the predictions and their average probability.
+        """
+        average = self._average(probas)
+        top = average.argmax(axis=1)
+        return self.classes[top], average.max(axis=1)
+
+    def _average(self, probas):
+        weights = self._get_weights(probas)
+        return np.tensordot(weights, np.stack(list(probas.values())), axes=1) / weights.sum()
+
+    def update(self, new_data, full_train_every=DEFAULT_FULL_TRAIN_EVERY,
+               max_accuracy_drop=DEFAULT_MAX_ACCURACY_DROP):
+        """
+        Train a trained model over new employees without training it from scratch.
+        The model is trained from scratch on every full_train_every update, when the new employees have categories
+        that were never seen, or when the accuracy over the new employees is lower than the test accuracy
+        by more than max_accuracy_drop.
+        Returns True if the model was trained from scratch.
+        """
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+
+        new_data = new_data[list(self.hr_retention_data.columns)].fillna(0)
+        new_data.index = pd.RangeIndex(len(self.hr_retention_data), len(self.hr_retention_data) + len(new_data))
+        self.hr_retention_data = downcast(pd.concat([self.hr_retention_data, new_data]))
+        self._number_of_employees = len(self.hr_retention_data)
+
+        unknown = self.encoder.unknown
+        self.encoder.unknown = "error"
+        try:
+            fitted_data = self.encoder.transform(new_data)
+        except ValueError as e:
+            logging.info(f"Training from scratch, new categories: {e}")
+            self.train()
+            return True
+        finally:
+            self.encoder.unknown = unknown
+
+        if self.incremental_updates + 1 >= full_train_every:
+            logging.info(f"Training from scratch after {self.incremental_updates} updates")
+            self.train()
+            return True
+
+        x_new, y_new = fitted_data[self.x_cols], fitted_data["Attrition"]
+        test_accuracy = accuracy_score(self.y_test, self.predict(self.x_test))
+        new_accuracy = accuracy_score(y_new, self.predict(x_new))
+        logging.info(f"Accuracy over {len(new_data)} new employees: {new_accuracy}, test accuracy: {test_accuracy}")
+        if new_accuracy < test_accuracy - max_accuracy_drop:
+            logging.info("Training from scratch, the new employees drifted from the trained ones")
+            self.train()
+            return True
+
+        if len(new_data) >= 5:
+            x_train_new, x_test_new, y_train_new, y_test_new = train_test_split(x_new, y_new, test_size=0.2,
+                                                                                random_state=999)
+            self.x_test = pd.concat([self.x_test, x_test_new])
+            self.y_test = pd.concat([self.y_test, y_test_new])
+        else:
+            x_train_new, y_train_new = x_new, y_new
+        self.x_train = pd.concat([self.x_train, x_train_new])
+        self.y_train = pd.concat([self.y_train, y_train_new])
+        self._clear_metrics()
+
+        # Warm starting grows the fitted trees in place, and they may be shared with the registry's copy of the state
+        self.classifiers = copy.deepcopy(self.classifiers)
+        for model_name, model in self.classifiers.items():
+            logging.info(f"Updating model: {model_name}")
+            self._report_progress(f"Updating {model_name}")
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            with span("warm_start", classifier=model_name):
+                warm_start_classifier(model_name, model, self.x_train, self.y_train, len(x_train_new))
+            self.timings[f"update_{model_name}"] = log_timing(model_name, "Updating",
+                                                              time.perf_counter() - start_wall,
+                                                              time.process_time() - start_cpu,
+                                                              self._classifiers_n_jobs[model_name])
+            self.log_train_res(model, model_name)
+        self.incremental_updates += 1
+        self._calibrate_cascade()
+        return False
+
+    def _clear_metrics(self):
+        self.metrics = {}
+        self.test_scores = {}
+        self._evaluations = {}
+        self._explainers = {}
+        self._attributions = OrderedDict()
+        self.cascade = None
 
     def log_train_res(self, model, model_name):
         """
-        Log training data
+        Evaluate a trained classifier by the evaluation policy and log its metrics
+        """
+        if self.evaluation == "off":
+            return
+        if self.evaluation == "deferred":
+            self._evaluations[model_name] = get_background_executor().submit(self._evaluate, model, model_name,
+                                                                             self.metrics, self.test_scores)
+            return
+        self._evaluate(model, model_name, self.metrics, self.test_scores)
+
+    def _evaluate(self, model, model_name, metrics_by_name, test_scores):
+        """
+        Evaluate a classifier into the given metrics and test scores, which are replaced when the model is trained
+        again, so an evaluation that finishes after that is dropped
         """
-        logging.info(f"Train accuracy for {model_name}: "
-              f"{accuracy_score(self.y_train, model.predict(self.x_train))}")
+        x_train, y_train, x_test, y_test = self.x_train, self.y_train, self.x_test, self.y_test
+        metrics = {}
+        if self.evaluation in ("full", "deferred", "subsample"):
+            if self.evaluation == "subsample":
+                x_train, y_train = subsample(x_train, y_train, self.evaluation_rows)
+            with span("log_train_res", classifier=model_name, split="train"):
+                metrics["train"] = get_metrics(y_train, predict_scores(model, x_train), model.classes_)
+
+        if self.evaluation == "subsample" and len(x_test) > self.evaluation_rows:
+            x_test, y_test = subsample(x_test, y_test, self.evaluation_rows)
+            with span("log_train_res", classifier=model_name, split="test"):
+                metrics["test"] = get_metrics(y_test, predict_scores(model, x_test), model.classes_)
+        else:
+            with span("log_train_res", classifier=model_name, split="test"):
+                scores = predict_scores(model, x_test)
+            metrics["test"] = get_metrics(y_test, scores, model.classes_)
+            test_scores[model_name] = scores
+
+        for split, split_metrics in metrics.items():
+            log_metrics(model_name, split, split_metrics)
+        metrics_by_name[model_name] = metrics
+        return metrics
 
-        logging.info(f"Test accuracy for {model_name}: "
-              f"{accuracy_score(self.y_test, model.predict(self.x_test))}")
+    def wait_for_evaluation(self):
+        """
+        Wait for the deferred evaluations to finish, returns the metrics of every classifier
+        """
+        for future in list(self._evaluations.values()):
+            future.result()
+        return self.metrics
 
     @staticmethod
-    def fit_data(vals: dict):
+    def _copy_trained_state(state):
+        """
+        Copy a trained state, so the models restored from it and the state itself do not change each other.
+        The classifiers are copied shallowly: their parameters are their own, and their fitted trees are shared
+        since fitting replaces them (warm starting grows them in place, so update copies them deeply first).
+        """
+        state = dict(state)
+        state["classifiers"] = {model_name: copy.copy(model) for model_name, model in state["classifiers"].items()}
+        state["encoder"] = copy.deepcopy(state["encoder"])
+        # Deferred evaluations may still add to the metrics and the test scores
+        state["metrics"] = copy.deepcopy(state["metrics"])
+        for attr in ("test_scores", "COLS_INDEXES"):
+            state[attr] = dict(state[attr])
+        return state
+
+    def get_trained_state(self):
+        """
+        Get everything needed to restore this model after training, as a copy of it.
+        Deferred evaluations are waited for first, so the copy has all the metrics and test scores.
+        """
+        self.wait_for_evaluation()
+        state = {attr: getattr(self, attr) for attr in self.TRAINED_ATTRIBUTES}
+        state["COLS_INDEXES"] = HREmployeeAttritionModel.COLS_INDEXES
+        return self._copy_trained_state(state)
+
+    def set_trained_state(self, state):
+        """
+        Restore a model from a copy of a state returned by get_trained_state
+        """
+        state = self._copy_trained_state(state)
+        for attr in self.TRAINED_ATTRIBUTES:
+            setattr(self, attr, state[attr])
+        self._evaluations = {}
+        self._fill_values = None
+        self._explainers = {}
+        self._attributions = OrderedDict()
+        self.set_n_jobs(self.n_jobs)
+        HREmployeeAttritionModel.COLS_INDEXES = dict(state["COLS_INDEXES"])
+
+    def explain(self, data):
+        """
+        Attribute the probability of attrition of every employee in data (encoded features) to the features, by the
+        tree classifiers (see model.attribution).
+        Returns frames of the attributions by the name of every tree classifier, and "ensemble" for their weighted
+        average. The attributions of the same data are cached until the model is trained again.
+        """
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(np.asarray(data, dtype=float), columns=self.x_cols)
+        key = hashlib.sha1(np.ascontiguousarray(data.to_numpy(dtype=np.float64)).tobytes()).hexdigest()
+        if key in self._attributions:
+            self._attributions.move_to_end(key)
+            return self._attributions[key]
+
+        positive_code = self.encoder.encode("Attrition", ["Yes"])[0]
+        frames = {}
+        with span("explain", rows=len(data)):
+            for model_name, model in self.classifiers.items():
+                if not is_explainable(model):
+                    continue
+                if model_name not in self._explainers:
+                    positive = list(model.classes_).index(positive_code)
+                    self._explainers[model_name] = TreeExplainer(model, len(self.x_cols), positive)
+                attributions, bias = self._explainers[model_name].explain(data)
+                frames[model_name] = to_frame(attributions, bias, self.x_cols, data.index)
+        if frames:
+            weights = self._get_weights(frames)
+            frames["ensemble"] = sum(frame * weight for frame, weight in zip(frames.values(), weights)) / weights.sum()
+
+        # Large batches (like the chunks of bulk scoring) are not cached, they are not explained again
+        if len(data) <= MAX_CACHED_ROWS:
+            self._attributions[key] = frames
+            while len(self._attributions) > MAX_CACHED_ATTRIBUTIONS:
+                self._attributions.popitem(last=False)
+        return frames
+
+    def get_fill_values(self):
+        """
+        Get the values that missing features are imputed with: the most frequent category of categorical features
+        and the median of the others, over the HR data
+        """
+        if self._fill_values is None:
+            fill_values = {}
+            for col in self.x_cols:
+                if col in self.encoder:
+                    fill_values[col] = self.encoder.most_frequent[col]
+                else:
+                    values = self.hr_retention_data[col]
+                    median = float(values.median())
+                    fill_values[col] = int(round(median)) if pd.api.types.is_integer_dtype(values) else median
+            self._fill_values = fill_values
+        return self._fill_values
+
+    def impute(self, vals: dict):
+        """
+        Get a record of all the features of the model from a record that may miss some of them,
+        the missing features get their values from get_fill_values
+        """
+        fill_values = self.get_fill_values()
+        return {col: vals[col] if col in vals else fill_values[col] for col in self.x_cols}
+
+    def fit_data(self, vals: dict):
         """
         Fit given data
         """
-        result = []
-        for key, val in vals.items():
-            if key in COLS_TO_ENCODE:
-                result.append(COLS_TO_ENCODE[key][val])
+        return [float(val) for val in self.encoder.transform_record(vals).values()]
+
+    def fit_frame(self, data):
+        """
+        Fit a whole frame of employees to the features the model was trained on
+        """
+        columns = []
+        for col in self.x_cols:
+            if col in self.encoder:
+                columns.append(self.encoder.encode(col, data[col]).astype(float))
             else:
-                result.append(float(val))
+                columns.append(data[col].to_numpy(dtype=float))
+        return np.column_stack(columns)
 
-        return result
+    def decode(self, col, codes):
+        """
+        Get the original values of encoded values of a column
+        """
+        return self.encoder.decode(col, codes)
@@ -0,0 +1,145 @@
+"""
+Attributions of the predictions of the tree classifiers to the features: how much every feature moved the
+probability of attrition of every employee away from its average over the train set.
+Every tree is attributed by its decision paths: every split adds the change of the prediction between a node and
+its child to the feature it splits by. The attributions of every leaf are computed once, so a batch costs about
+one more pass over the trees, finding the leaves of its rows. XGBoost attributes its trees the same way (its
+approximate contributions, in log-odds), and they are rescaled to probabilities. Every row's attributions add up to
+its probability minus the bias.
+"""
+import numpy as np
+import pandas as pd
+
+BIAS_COL = "bias"
+# Attributions of at most this many batches of at most this many rows each are cached by the model
+MAX_CACHED_ATTRIBUTIONS = 8
+MAX_CACHED_ROWS = 5000
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _leaf_paths(tree, n_features, positive, features=None):
+    """
+    Get the attributions of every leaf of a tree: the changes of the probability of the positive class along the
+    path from the root to the leaf, by the features of the splits, as a sparse (nodes, features) matrix.
+    Returns it and the probability at the root.
+    """
+    from scipy.sparse import csr_matrix
+
+    t = tree.tree_
+    value = t.value[:, 0, :]
+    probas = value[:, positive] / value.sum(axis=1)
+    split_features = t.feature if features is None else np.asarray(features)[np.maximum(t.feature, 0)]
+    paths = np.zeros((t.node_count, n_features))
+    # Level by level, every child gets the path of its parent and the change of its split
+    frontier = np.array([0])
+    while len(frontier):
+        is_split = t.children_left[frontier] >= 0
+        parents = frontier[is_split]
+        children = []
+        for side in (t.children_left, t.children_right):
+            side_children = side[parents]
+            paths[side_children] = paths[parents]
+            paths[side_children, split_features[parents]] += probas[side_children] - probas[parents]
+            children.append(side_children)
+        frontier = np.concatenate(children)
+    paths[t.children_left >= 0] = 0
+    return csr_matrix(paths), probas[0]
+
+
+class TreeExplainer(object):
+    """
+    Attributes the probability of the positive class of a fitted tree classifier (a forest, a bagging classifier of
+    trees or XGBoost) to its features, the tables of the trees are built once
+    """
+    def __init__(self, classifier, n_features, positive=1):
+        from scipy.sparse import vstack
+
+        self.classifier = classifier
+        self.n_features = n_features
+        self.positive = positive
+        if hasattr(classifier, "get_booster"):
+            self.kind = "xgboost"
+            return
+
+        estimators = classifier.estimators_
+        features = getattr(classifier, "estimators_features_", None)
+        if not all(hasattr(estimator, "tree_") for estimator in estimators):
+            raise ValueError(f"Only ensembles of trees can be explained, not {type(classifier).__name__}")
+        # A forest finds the leaves of all its trees at once, a bagging classifier finds them tree by tree
+        self.kind = "forest" if hasattr(classifier, "apply") and features is None else "bagging"
+        tables = [_leaf_paths(estimator, n_features, positive, None if features is None else features[i])
+                  for i, estimator in enumerate(estimators)]
+        self._paths = vstack([paths for paths, _ in tables]).tocsr()
+        self._offsets = np.cumsum([0] + [paths.shape[0] for paths, _ in tables[:-1]])
+        self._bias = float(np.mean([bias for _, bias in tables]))
+
+    def _leaves(self, x):
+        """
+        Get the rows of the leaves every row of x falls in, in the table of the leaves of all the trees
+        """
+        if self.kind == "forest":
+            leaves = self.classifier.apply(x)
+        else:
+            x = np.asarray(x, dtype=np.float32)
+            leaves = np.column_stack([estimator.apply(x[:, estimator_features]) for estimator, estimator_features
+                                      in zip(self.classifier.estimators_, self.classifier.estimators_features_)])
+        return leaves + self._offsets
+
+    def explain(self, x):
+        """
+        Get the attributions of every row of x (encoded features) and the bias, in probabilities of the positive class
+        """
+        if self.kind == "xgboost":
+            return self._explain_xgboost(np.asarray(x, dtype=np.float32))
+        from scipy.sparse import csr_matrix
+
+        leaves = self._leaves(x)
+        n_rows, n_trees = leaves.shape
+        # Every row sums the attributions of its leaf in every tree, a single sparse product for the batch
+        rows = csr_matrix((np.full(leaves.size, 1 / n_trees), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+                          shape=(n_rows, self._paths.shape[0]))
+        return np.asarray((rows @ self._paths).todense()), np.full(n_rows, self._bias)
+
+    def _explain_xgboost(self, x):
+        import xgboost
+
+        booster = self.classifier.get_booster()
+        contributions = booster.predict(xgboost.DMatrix(x, feature_names=booster.feature_names),
+                                        pred_contribs=True, approx_contribs=True)
+        attributions, bias_margin = contributions[:, :-1].astype(np.float64), contributions[:, -1].astype(np.float64)
+        margin = bias_margin + attributions.sum(axis=1)
+        # Every row is rescaled so its attributions add up to its probability minus the probability of the bias
+        change = margin - bias_margin
+        close = np.abs(change) < 1e-9
+        slope = np.where(close, _sigmoid(margin) * (1 - _sigmoid(margin)),
+                         (_sigmoid(margin) - _sigmoid(bias_margin)) / np.where(close, 1, change))
+        if self.positive == 0:
+            return -attributions * slope[:, None], 1 - _sigmoid(bias_margin)
+        return attributions * slope[:, None], _sigmoid(bias_margin)
+
+
+def is_explainable(classifier):
+    return hasattr(classifier, "get_booster") or \
+        all(hasattr(estimator, "tree_") for estimator in getattr(classifier, "estimators_", [None]))
+
+
+def to_frame(attributions, bias, x_cols, index=None):
+    """
+    Get attributions as a frame of the features and the bias, every row adds up to its probability
+    """
+    frame = pd.DataFrame(attributions, columns=x_cols, index=index)
+    frame[BIAS_COL] = bias
+    return frame
+
+
+def top_features(attributions, n=5):
+    """
+    Get the n features that pushed a row of attributions (a series of a frame returned by to_frame) the most
+    toward the positive class, with their attributions
+    """
+    attributions = attributions.drop(BIAS_COL, errors="ignore")
+    top = attributions[attributions > 0].sort_values(ascending=False)[:n]
+    return list(top.items())
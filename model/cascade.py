@@ -0,0 +1,98 @@
+"""
+Cascade inference: the classifiers that predict an employee within their latency budget vote first, and the others
+are consulted only for the employees the first ones are not confident about, where all the classifiers vote together
+like the full ensemble. The confidence is the average probability the first classifiers gave to their prediction
+(with hard voting too, where the share of the votes is too coarse to tell the employees apart), and the threshold is
+the lowest one whose cascade predicts at most a given share of the test set differently than the full ensemble.
+Every such employee costs at most one correct prediction, so the share bounds the accuracy the cascade loses.
+"""
+import logging
+import time
+
+import numpy as np
+
+DEFAULT_CASCADE_ACCURACY_DROP = 0.01
+LATENCY_REPEATS = 7
+
+
+def measure_latency(classifier, x, method="predict", repeats=LATENCY_REPEATS):
+    """
+    Get the median time (in seconds) a classifier takes to predict a single employee of x (a frame, like the one it
+    was fitted on)
+    """
+    latencies = []
+    for i in range(repeats):
+        row = x.iloc[i % len(x):i % len(x) + 1]
+        start = time.perf_counter()
+        getattr(classifier, method)(row)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies))
+
+
+def split_stages(latencies, budgets):
+    """
+    Split the classifiers to those within their latency budgets (in milliseconds, classifiers without a budget are
+    always within it) and those over them, by their latencies in seconds
+    """
+    first = [name for name, latency in latencies.items()
+             if budgets.get(name) is None or latency * 1000 <= budgets[name]]
+    return first, [name for name in latencies if name not in first]
+
+
+def choose_threshold(confidence, first_predictions, full_predictions, max_accuracy_drop):
+    """
+    Get the lowest confidence of the first stage from which its predictions are kept, so the cascade predicts at most
+    max_accuracy_drop of the employees differently than the full ensemble
+    """
+    differs = first_predictions != full_predictions
+    for threshold in np.unique(confidence):
+        if np.mean(differs & (confidence >= threshold)) <= max_accuracy_drop:
+            return float(threshold)
+    return np.inf
+
+
+def get_cascade_settings(model):
+    """
+    Get the settings a cascade of a HREmployeeAttritionModel is calibrated for
+    """
+    return {"budgets": dict(model.latency_budgets), "accuracy_drop": model.cascade_accuracy_drop,
+            "voting": model.voting, "classifiers": list(model.classifiers)}
+
+
+def calibrate_cascade(model, budgets, max_accuracy_drop=DEFAULT_CASCADE_ACCURACY_DROP):
+    """
+    Get the cascade of a trained HREmployeeAttritionModel: the classifiers of its two stages, the confidence
+    threshold over its test set, the latencies of the classifiers and the settings it was calibrated for
+    """
+    method = "predict_proba" if model.voting == "soft" else "predict"
+    latencies = {name: measure_latency(classifier, model.x_test, method)
+                 for name, classifier in model.classifiers.items()}
+    first, deferred = split_stages(latencies, budgets)
+    cascade = {"first": first, "deferred": deferred, "threshold": np.inf, "latencies": latencies,
+               "settings": get_cascade_settings(model)}
+    if not first or not deferred:
+        logging.info(f"No cascade, {len(first)} classifiers are within their latency budgets")
+        return dict(cascade, first=first + deferred, deferred=[])
+
+    probas = model._predict_with_classifiers(model.x_test, "predict_proba", first)
+    first_outputs = probas if model.voting == "soft" else model._get_votes(probas, "predict_proba")
+    first_predictions, _ = model.combine(first_outputs)
+    confidence = model.get_probability_of(probas, first_predictions)
+    full_predictions, _ = model.combine(model._predict_with_classifiers(model.x_test, method))
+    threshold = choose_threshold(confidence, first_predictions, full_predictions, max_accuracy_drop)
+    if np.isinf(threshold):
+        logging.info(f"No cascade, {first} predict more than {max_accuracy_drop} of the test set differently without "
+                     f"{deferred}")
+        return dict(cascade, first=first + deferred, deferred=[])
+    if threshold <= confidence.min():
+        logging.warning(f"{deferred} were consulted for none of the test set, {first} predict at most "
+                        f"{max_accuracy_drop} of it differently without them. Remove them from the ensemble, or "
+                        f"lower the accuracy drop to consult them")
+
+    cascade["threshold"] = threshold
+    answered = np.mean(confidence >= threshold)
+    expected = sum(latencies[name] for name in first) + (1 - answered) * sum(latencies[name] for name in deferred)
+    logging.info(f"Cascade: {first} vote first, {deferred} only below probability {threshold:.3f} "
+                 f"({1 - answered:.1%} of the test set), about {expected * 1000:.2f}ms per employee instead of "
+                 f"{sum(latencies.values()) * 1000:.2f}ms")
+    return cascade
@@ -0,0 +1,426 @@
+"""
+Compiled copy of a trained HREmployeeAttritionModel for fast predictions of a few employees.
+The trees of the forests, the bagging classifier and XGBoost are flattened into numpy arrays, the KNN keeps its
+reference set, and the encoder keeps its tables. Loading and predicting with it needs numpy only.
+"""
+import json
+
+import numpy as np
+
+COMPILED_VERSION = 1
+# Tree traversals of more rows than this are split, so the traversed (row, tree) pairs fit in memory
+MAX_TRAVERSED_NODES = 2 ** 20
+MAX_KNN_DISTANCES = 2 ** 22
+# Number of steps of a tree traversal between dropping the trees that reached their leaves
+TRAVERSAL_STEPS_PER_CHECK = 3
+
+
+def _float32_at_most(thresholds):
+    """
+    Get the largest float32 values that are lower than or equal to thresholds, so comparing float32 values to them
+    with <= gives the same results as comparing them to the thresholds themselves
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rounded = thresholds.astype(np.float32)
+    too_big = rounded.astype(np.float64) > thresholds
+    rounded[too_big] = np.nextafter(rounded[too_big], np.float32(-np.inf))
+    return rounded
+
+
+class _TreesBuilder(object):
+    """
+    Collects trees as flat arrays. Every node goes to its left child (children[2 * node]) if its feature is <= its
+    threshold or is missing and default_left is set, and to its right child (children[2 * node + 1]) otherwise.
+    Leaves point to themselves.
+    """
+    def __init__(self, n_classes):
+        self.n_classes = n_classes
+        self.nodes = {"feature": [], "threshold": [], "children": [], "default_left": [], "value": []}
+        self.roots = []
+
+    def add(self, feature, threshold, left, right, default_left, value):
+        offset = sum(len(feature) for feature in self.nodes["feature"])
+        nodes = np.arange(len(feature))
+        is_leaf = left < 0
+        self.nodes["feature"].append(np.where(is_leaf, 0, feature).astype(np.int32))
+        self.nodes["threshold"].append(np.where(is_leaf, np.inf, threshold).astype(np.float32))
+        children = np.column_stack([np.where(is_leaf, nodes, left), np.where(is_leaf, nodes, right)]) + offset
+        self.nodes["children"].append(children.ravel().astype(np.int32))
+        self.nodes["default_left"].append(np.where(is_leaf, True, default_left).astype(bool))
+        self.nodes["value"].append(np.asarray(value, dtype=np.float64))
+        self.roots.append(offset)
+
+    def add_sklearn_tree(self, estimator, features=None):
+        tree = estimator.tree_
+        feature = tree.feature if features is None else np.asarray(features)[np.maximum(tree.feature, 0)]
+        value = tree.value[:, 0, :]
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+        if value.shape[1] != self.n_classes:
+            # A tree of bagging that did not see all the classes in its sample
+            full_value = np.zeros((len(value), self.n_classes))
+            full_value[:, np.asarray(estimator.classes_, dtype=int)] = value
+            value = full_value
+        default_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=bool))
+        self.add(feature, _float32_at_most(tree.threshold), tree.children_left, tree.children_right,
+                 np.asarray(default_left, dtype=bool), value)
+
+    def add_xgboost_trees(self, booster, x_cols):
+        trees = booster.trees_to_dataframe()
+        for _, tree in trees.groupby("Tree", sort=True):
+            ids = {node_id: i for i, node_id in enumerate(tree["ID"])}
+            is_leaf = (tree["Feature"] == "Leaf").to_numpy()
+            feature = np.asarray([0 if leaf else self._xgboost_feature(name, x_cols)
+                                  for leaf, name in zip(is_leaf, tree["Feature"])])
+            left = np.asarray([-1 if leaf else ids[node_id] for leaf, node_id in zip(is_leaf, tree["Yes"])])
+            right = np.asarray([-1 if leaf else ids[node_id] for leaf, node_id in zip(is_leaf, tree["No"])])
+            default_left = (tree["Missing"] == tree["Yes"]).to_numpy()
+            # XGBoost goes left when the value is < the split, which for float32 values is <= the float32 before it
+            split = tree["Split"].fillna(0).to_numpy().astype(np.float32)
+            threshold = np.nextafter(split, np.float32(-np.inf))
+            value = np.zeros((len(tree), self.n_classes))
+            value[:, -1] = np.where(is_leaf, tree["Gain"].to_numpy(), 0)
+            self.add(feature, threshold, left, right, default_left, value)
+
+    @staticmethod
+    def _xgboost_feature(name, x_cols):
+        if name in x_cols:
+            return x_cols.index(name)
+        return int(name[1:])
+
+    def arrays(self):
+        arrays = {name: np.concatenate(parts) for name, parts in self.nodes.items()}
+        arrays["roots"] = np.asarray(self.roots, dtype=np.int32)
+        return arrays
+
+
+def _prepare_trees(trees):
+    """
+    Add the arrays a traversal reads to trees: the feature, threshold (as int32 bits) and children of every node
+    packed together so a step reads them at once, and whether every node is a leaf
+    """
+    children = trees["children"].reshape(-1, 2)
+    trees["table"] = np.column_stack([trees["feature"], trees["threshold"].view(np.int32), children])
+    trees["is_leaf"] = children[:, 0] == np.arange(len(children))
+    return trees
+
+
+def _traverse(x, trees):
+    """
+    Get the leaf of every tree for every row of x (a float32 matrix), as a (rows, trees) matrix of nodes.
+    Every few steps the trees that reached their leaves are dropped, so the shallow trees of XGBoost and the short
+    paths of the forests are not stepped through as long as the deepest path.
+    """
+    n_rows, n_features = x.shape
+    roots = trees["roots"]
+    flat_x = x.ravel()
+    table, is_leaf = trees["table"], trees["is_leaf"]
+    nodes = np.tile(roots, n_rows)
+    positions = np.arange(len(nodes))
+    leaves = np.empty(len(nodes), dtype=nodes.dtype)
+    # A single row needs no offsets of rows, and only rows with missing values need their defaults
+    row_offsets = np.repeat(np.arange(n_rows) * n_features, len(roots)) if n_rows > 1 else None
+    default_right = ~trees["default_left"] if np.isnan(flat_x).any() else None
+    step = 0
+    while len(nodes):
+        records = table[nodes]
+        vals = flat_x[records[:, 0] if row_offsets is None else records[:, 0] + row_offsets]
+        go_right = vals > records[:, 1].view(np.float32)
+        if default_right is not None:
+            go_right |= np.isnan(vals) & default_right[nodes]
+        nodes = np.where(go_right, records[:, 3], records[:, 2])
+        step += 1
+        if step % TRAVERSAL_STEPS_PER_CHECK == 0:
+            done = is_leaf[nodes]
+            leaves[positions[done]] = nodes[done]
+            keep = ~done
+            positions, nodes = positions[keep], nodes[keep]
+            if row_offsets is not None:
+                row_offsets = row_offsets[keep]
+    return leaves.reshape(n_rows, len(roots))
+
+
+def _predict_trees(x, trees, slices=None):
+    """
+    Get the sum of the leaf values of the trees for every row of x, for every slice of the trees
+    (all of them by default)
+    """
+    slices = slices or [(0, len(trees["roots"]))]
+    rows_per_batch = max(1, MAX_TRAVERSED_NODES // len(trees["roots"]))
+    sums = [[] for _ in slices]
+    for start in range(0, len(x), rows_per_batch):
+        leaf_values = trees["value"][_traverse(x[start:start + rows_per_batch], trees)]
+        for slice_sums, (first, last) in zip(sums, slices):
+            slice_sums.append(leaf_values[:, first:last].sum(axis=1))
+    n_classes = trees["value"].shape[1]
+    return [np.concatenate(slice_sums) if slice_sums else np.zeros((0, n_classes)) for slice_sums in sums]
+
+
+def _merge_trees(components):
+    """
+    Merge the trees of several classifiers, so they are traversed together.
+    Returns the merged trees and the slice of the trees of every classifier.
+    """
+    merged = {name: [] for name in ("feature", "threshold", "children", "default_left", "value", "roots")}
+    slices = []
+    n_nodes = n_trees = 0
+    for trees in components:
+        for name in ("feature", "threshold", "default_left", "value"):
+            merged[name].append(trees[name])
+        merged["children"].append(trees["children"] + n_nodes)
+        merged["roots"].append(trees["roots"] + n_nodes)
+        slices.append((n_trees, n_trees + len(trees["roots"])))
+        n_nodes += len(trees["feature"])
+        n_trees += len(trees["roots"])
+    return _prepare_trees({name: np.concatenate(parts) for name, parts in merged.items()}), slices
+
+
+def _predict_knn(x, knn, params):
+    """
+    Get the class probabilities of a KNN for every row of x by its reference set
+    """
+    fit_x, fit_y = knn["fit_x"], knn["fit_y"]
+    if "scale" in knn:
+        x = (x - knn["mean"]) / knn["scale"]
+    k, n_classes = params["n_neighbors"], params["n_classes"]
+    rows_per_batch = max(1, MAX_KNN_DISTANCES // len(fit_x))
+    probas = []
+    for start in range(0, len(x), rows_per_batch):
+        batch = x[start:start + rows_per_batch]
+        if params["p"] == 2:
+            # Squared euclidean distances by |a - b|^2 = |a|^2 - 2ab + |b|^2, without the differences of all pairs
+            distances = knn["fit_sq_norms"] - 2 * batch @ fit_x.T + (batch ** 2).sum(axis=1)[:, None]
+        else:
+            distances = (np.abs(batch[:, None, :] - fit_x[None, :, :]) ** params["p"]).sum(axis=2)
+        neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        if params["weights"] == "distance":
+            neighbor_distances = np.maximum(np.take_along_axis(distances, neighbors, axis=1), 0) ** (1 / params["p"])
+            with np.errstate(divide="ignore"):
+                weights = 1 / neighbor_distances
+            exact = np.isinf(weights)
+            exact_rows = exact.any(axis=1)
+            weights[exact_rows] = exact[exact_rows]
+        else:
+            weights = np.ones(neighbors.shape)
+        batch_probas = np.zeros((len(batch), n_classes))
+        np.add.at(batch_probas, (np.arange(len(batch))[:, None], fit_y[neighbors]), weights)
+        probas.append(batch_probas / batch_probas.sum(axis=1, keepdims=True))
+    return np.concatenate(probas) if probas else np.zeros((0, n_classes))
+
+
+class CompiledModel(object):
+    """
+    Compiled copy of a trained HREmployeeAttritionModel, predicts like the model it was compiled from
+    """
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.x_cols = meta["x_cols"]
+        self.classes = np.asarray(meta["classes"])
+        self.voting = meta["voting"]
+        self.classifier_names = [component["name"] for component in meta["classifiers"]]
+        self._weights = np.asarray([component["weight"] for component in meta["classifiers"]])
+        encoder = meta["encoder"]
+        self._unknown = encoder["unknown"]
+        self._categories = {col: np.asarray(categories) for col, categories in encoder["categories"].items()}
+        self._codes = {col: {category: code for code, category in enumerate(categories)}
+                       for col, categories in encoder["categories"].items()}
+        self._most_frequent = {col: self._codes[col][category]
+                               for col, category in encoder["most_frequent"].items()}
+        self._components = [(component, {name[len(component["name"]) + 1:]: val for name, val in arrays.items()
+                                         if name.startswith(component["name"] + ".")})
+                            for component in meta["classifiers"]]
+        for component, arrays in self._components:
+            if component["type"] == "knn":
+                arrays["fit_sq_norms"] = (arrays["fit_x"] ** 2).sum(axis=1)
+        tree_components = [(component, trees) for component, trees in self._components if component["type"] != "knn"]
+        self._tree_names = [component["name"] for component, _ in tree_components]
+        self._trees, self._tree_slices = _merge_trees([trees for _, trees in tree_components]) \
+            if tree_components else (None, [])
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Compile a trained HREmployeeAttritionModel
+        """
+        classes = np.asarray(model.classes)
+        meta = {"version": COMPILED_VERSION, "x_cols": list(model.x_cols), "classes": classes.tolist(),
+                "voting": model.voting, "encoder": model.encoder.to_dict(), "classifiers": []}
+        arrays = {}
+        for model_name, classifier in model.classifiers.items():
+            component, component_arrays = cls._compile_classifier(classifier, list(model.x_cols), len(classes))
+            component.update(name=model_name, weight=float(model.weights.get(model_name, 1.0)))
+            if component["type"] == "boosted_trees":
+                component["base_margin"] = cls._get_base_margin(classifier, model.x_train.iloc[:10], component_arrays)
+            meta["classifiers"].append(component)
+            arrays.update({f"{model_name}.{name}": val for name, val in component_arrays.items()})
+        return cls(meta, arrays)
+
+    @staticmethod
+    def _compile_classifier(classifier, x_cols, n_classes):
+        if hasattr(classifier, "get_booster"):
+            if n_classes != 2:
+                raise ValueError("Only binary XGBoost classifiers can be compiled")
+            builder = _TreesBuilder(n_classes)
+            builder.add_xgboost_trees(classifier.get_booster(), x_cols)
+            return {"type": "boosted_trees"}, builder.arrays()
+        if hasattr(classifier, "estimators_"):
+            builder = _TreesBuilder(n_classes)
+            features = getattr(classifier, "estimators_features_", [None] * len(classifier.estimators_))
+            for estimator, estimator_features in zip(classifier.estimators_, features):
+                if not hasattr(estimator, "tree_"):
+                    raise ValueError(f"Only ensembles of trees can be compiled, not of {type(estimator).__name__}")
+                builder.add_sklearn_tree(estimator, estimator_features)
+            return {"type": "forest"}, builder.arrays()
+        if hasattr(classifier, "fit_x_"):
+            # ScaledKNeighborsClassifier, its reference set is already scaled
+            return ({"type": "knn", "n_neighbors": int(classifier.n_neighbors), "weights": classifier.weights,
+                     "p": 2.0, "n_classes": n_classes},
+                    {"fit_x": classifier.fit_x_, "fit_y": np.asarray(classifier.fit_y_, dtype=np.int64),
+                     "mean": classifier.mean_, "scale": classifier.scale_})
+        if hasattr(classifier, "_fit_X"):
+            p = 2 if classifier.effective_metric_ == "euclidean" else classifier.effective_metric_params_.get("p")
+            if classifier.effective_metric_ not in ("euclidean", "manhattan", "minkowski") or not p or \
+                    callable(classifier.weights):
+                raise ValueError("Only KNN with minkowski distances and uniform or distance weights can be compiled")
+            if classifier.effective_metric_ == "manhattan":
+                p = 1
+            return ({"type": "knn", "n_neighbors": int(classifier.n_neighbors), "weights": classifier.weights,
+                     "p": float(p), "n_classes": n_classes},
+                    {"fit_x": np.asarray(classifier._fit_X, dtype=np.float64),
+                     "fit_y": np.asarray(classifier._y, dtype=np.int64)})
+        raise ValueError(f"{type(classifier).__name__} can not be compiled")
+
+    @staticmethod
+    def _get_base_margin(classifier, x, arrays):
+        """
+        Get the margin XGBoost adds to the sum of its trees, by comparing its margins to the sum of the trees
+        """
+        margins = classifier.predict(x, output_margin=True)
+        sums = _predict_trees(np.asarray(x, dtype=np.float32), _prepare_trees(dict(arrays)))[0][:, -1]
+        return float(np.mean(margins - sums))
+
+    def save(self, path):
+        """
+        Save the compiled model as a single .npz file
+        """
+        np.savez(path, meta=np.asarray(json.dumps(self.meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a compiled model saved by save
+        """
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["version"] != COMPILED_VERSION:
+                raise ValueError(f"{path} was compiled by version {meta['version']}, expected {COMPILED_VERSION}")
+            return cls(meta, {name: data[name] for name in data.files if name != "meta"})
+
+    def _encode(self, col, values):
+        values = np.asarray(values).astype(str)
+        categories = self._categories[col]
+        codes = np.searchsorted(categories, values)
+        codes = np.minimum(codes, len(categories) - 1)
+        unknown = categories[codes] != values
+        if unknown.any():
+            if self._unknown == "error":
+                raise ValueError(f"Unknown values in {col}: {sorted(set(values[unknown]))}")
+            codes[unknown] = self._most_frequent[col] if self._unknown == "most_frequent" else -1
+        return codes
+
+    def transform_record(self, record: dict):
+        """
+        Encode a single employee to a row of the features the model was trained on
+        """
+        row = np.empty(len(self.x_cols))
+        for i, col in enumerate(self.x_cols):
+            val = record[col]
+            if col in self._codes:
+                code = self._codes[col].get(str(val))
+                if code is None:
+                    if self._unknown == "error":
+                        raise ValueError(f"Unknown values in {col}: {[val]}")
+                    code = self._most_frequent[col] if self._unknown == "most_frequent" else -1
+                val = code
+            row[i] = float(val)
+        return row
+
+    def fit_data(self, vals: dict):
+        """
+        Encode a single employee like HREmployeeAttritionModel.fit_data
+        """
+        return self.transform_record(vals).tolist()
+
+    def fit_frame(self, data):
+        """
+        Encode a whole frame of employees to the features the model was trained on
+        """
+        return np.column_stack([self._encode(col, data[col]).astype(float) if col in self._codes
+                                else np.asarray(data[col], dtype=float)
+                                for col in self.x_cols])
+
+    def decode(self, col, codes):
+        """
+        Get the original values of encoded values of a column
+        """
+        categories = np.asarray(list(self._categories[col]) + [None], dtype=object)
+        return categories[np.asarray(codes, dtype=int)]
+
+    def predict_probas(self, x):
+        """
+        Predict the probabilities of the classes with every classifier, returns them by the name of the classifier
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        tree_sums = {}
+        if self._trees is not None:
+            sums = _predict_trees(x.astype(np.float32), self._trees, self._tree_slices)
+            tree_sums = dict(zip(self._tree_names, sums))
+        probas = {}
+        for component, arrays in self._components:
+            if component["type"] == "knn":
+                probas[component["name"]] = _predict_knn(x, arrays, component)
+            elif component["type"] == "forest":
+                probas[component["name"]] = tree_sums[component["name"]] / len(arrays["roots"])
+            else:
+                positive = 1 / (1 + np.exp(-(tree_sums[component["name"]][:, -1] + component["base_margin"])))
+                probas[component["name"]] = np.column_stack([1 - positive, positive])
+        return probas
+
+    def predict_with_votes(self, x):
+        """
+        Predict from given data like HREmployeeAttritionModel.predict_with_votes.
+        Returns the predictions, the confidence of every prediction and the votes of every classifier.
+        """
+        probas = self.predict_probas(x)
+        stacked = np.stack(list(probas.values()))
+        top = stacked.argmax(axis=2)
+        votes = {model_name: self.classes[model_top] for model_name, model_top in zip(probas, top)}
+        if self.voting == "soft":
+            average = np.tensordot(self._weights, stacked, axes=1) / self._weights.sum()
+            return self.classes[average.argmax(axis=1)], average.max(axis=1), votes
+        counts = np.stack([self._weights @ (top == i) for i in range(len(self.classes))])
+        return self.classes[counts.argmax(axis=0)], counts.max(axis=0) / self._weights.sum(), votes
+
+    def predict_with_confidence(self, x):
+        predictions, confidence, _ = self.predict_with_votes(x)
+        return predictions, confidence
+
+    def predict(self, x):
+        return self.predict_with_votes(x)[0]
+
+    def predict_record(self, record: dict):
+        """
+        Predict for a single employee, returns the prediction and its confidence
+        """
+        predictions, confidence = self.predict_with_confidence(self.transform_record(record)[None, :])
+        return predictions[0], confidence[0]
+
+
+def compile_model(model, path=None):
+    """
+    Compile a trained HREmployeeAttritionModel, and save it to path if it is given
+    """
+    compiled = CompiledModel.from_model(model)
+    if path:
+        compiled.save(path)
+    return compiled
@@ -0,0 +1,127 @@
+"""
+K-fold cross validation of the classifiers of the ensemble.
+The HR data is encoded once to a single matrix that every worker gets once, and the folds are only arrays of row
+indexes into it. The classifiers of every fold are kept, so together they can serve as the ensemble.
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from model.evaluation import predict_scores, get_metrics
+from model.parallel import set_n_jobs
+
+DEFAULT_FOLDS = 5
+
+# The encoded matrix of the worker, set once by _init_worker
+_x = None
+_y = None
+_x_cols = None
+
+
+def _init_worker(x, y, x_cols):
+    global _x, _y, _x_cols
+    _x, _y, _x_cols = x, y, x_cols
+
+
+def fit_fold(fold, classifiers, train_indexes, test_indexes):
+    """
+    Fit the classifiers over the train rows of a fold and score them over its test rows,
+    used as the target of the cross validation workers.
+    Returns the fold, the fitted classifiers, their scores over the test rows and their metrics.
+    """
+    import pandas as pd
+
+    from joblib import parallel_backend
+
+    x_train = pd.DataFrame(_x[train_indexes], columns=_x_cols)
+    x_test = pd.DataFrame(_x[test_indexes], columns=_x_cols)
+    y_train, y_test = _y[train_indexes], _y[test_indexes]
+    scores, metrics = {}, {}
+    for model_name, model in classifiers.items():
+        start = time.perf_counter()
+        with parallel_backend("threading"):
+            model.fit(x_train, y_train)
+        fit_time = time.perf_counter() - start
+        scores[model_name] = predict_scores(model, x_test)
+        metrics[model_name] = dict(get_metrics(y_test, scores[model_name], model.classes_), fit_time=fit_time)
+    return fold, classifiers, scores, metrics
+
+
+def get_folds(y, folds=DEFAULT_FOLDS, seed=999):
+    """
+    Get the train and test row indexes of every fold, stratified by y
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    return list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y))
+
+
+def get_vote_shares(scores, weights, voting, n_classes):
+    """
+    Get the share of the classes in the vote of the classifiers: the weighted share of the classifiers that predicted
+    every class for hard voting, and the weighted average of their probabilities for soft voting
+    """
+    stacked = np.stack(scores)
+    if voting == "hard":
+        stacked = np.eye(n_classes)[stacked.argmax(axis=2)]
+    return np.tensordot(weights, stacked, axes=1) / weights.sum()
+
+
+def summarize(fold_metrics):
+    """
+    Get the mean and standard deviation of every metric over the folds
+    """
+    names = [name for name in fold_metrics[0] if isinstance(fold_metrics[0][name], float)]
+    return {name: {"mean": float(np.mean([metrics[name] for metrics in fold_metrics])),
+                   "std": float(np.std([metrics[name] for metrics in fold_metrics]))}
+            for name in names}
+
+
+def cross_validate(classifiers, x, y, x_cols, weights, voting, folds=DEFAULT_FOLDS, workers=1, seed=999):
+    """
+    Cross validate unfitted classifiers over an encoded matrix x (all of the folds with the same classifiers).
+    Returns the fitted classifiers of every fold, the metrics of every fold by the name of the classifier
+    (and "ensemble" for their vote) and the summary of the metrics over the folds.
+    """
+    from sklearn.base import clone
+
+    fold_indexes = get_folds(y, folds, seed)
+    fold_classifiers = [None] * folds
+    fold_metrics = [None] * folds
+    workers = min(workers, folds)
+    jobs = []
+    for fold, (train, test) in enumerate(fold_indexes):
+        fold_models = {model_name: clone(model) for model_name, model in classifiers.items()}
+        if workers > 1:
+            # Every fold has its own core
+            for model in fold_models.values():
+                set_n_jobs(model, 1)
+        jobs.append((fold, fold_models, train, test))
+    if workers <= 1:
+        _init_worker(x, y, x_cols)
+        results = (fit_fold(*job) for job in jobs)
+        executor = None
+    else:
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(x, y, x_cols))
+        results = (future.result() for future in as_completed([executor.submit(fit_fold, *job) for job in jobs]))
+
+    try:
+        for fold, fitted, scores, metrics in results:
+            classes = next(iter(fitted.values())).classes_
+            shares = get_vote_shares(list(scores.values()), weights, voting, len(classes))
+            metrics["ensemble"] = get_metrics(y[fold_indexes[fold][1]], shares, classes)
+            logging.info(f"Fold {fold + 1}/{folds}: ensemble accuracy {metrics['ensemble']['accuracy']:.3f}")
+            fold_classifiers[fold] = fitted
+            fold_metrics[fold] = metrics
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    summary = {model_name: summarize([metrics[model_name] for metrics in fold_metrics])
+               for model_name in fold_metrics[0]}
+    return {"folds": fold_metrics, "summary": summary, "classifiers": fold_classifiers}
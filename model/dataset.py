@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from model.instrumentation import span
+
+DEFAULT_CACHE_DIR = "DataCache"
+ID_COL = "EmployeeNumber"
+
+_loaded_data = {}
+_fingerprints = {}
+_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    """
+    Get a sha256 fingerprint of a file's content
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cached_file_fingerprint(path):
+    """
+    Get the fingerprint of a file, it is recalculated only when the file changes
+    """
+    stat_key = _stat_key(path)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != stat_key:
+        cached = (stat_key, file_fingerprint(path))
+        _fingerprints[path] = cached
+    return cached[1]
+
+
+def get_appended_path(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Get the path of the extract of the employees appended to a CSV file (see append_data)
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}.appended.csv")
+
+
+def get_fingerprint(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Get the fingerprint of a CSV file with the employees appended to it, it is recalculated only when they change
+    """
+    fingerprint = _cached_file_fingerprint(path)
+    appended_path = get_appended_path(path, cache_dir)
+    if not os.path.isfile(appended_path):
+        return fingerprint
+    return hashlib.sha256((fingerprint + _cached_file_fingerprint(appended_path)).encode()).hexdigest()
+
+
+class BinaryDataCache(object):
+    """
+    Binary copy of a CSV file, Feather when pyarrow is installed and pickle otherwise.
+    The copy is used as long as the CSV has the same mtime, or the same content if only its mtime changed.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def _paths_for(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.directory, f"{name}.bin"), os.path.join(self.directory, f"{name}.json")
+
+    @staticmethod
+    def _has_pyarrow():
+        try:
+            import pyarrow  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def load(self, path):
+        """
+        Load the binary copy of a CSV file, returns None if there is no valid copy
+        """
+        data_path, meta_path = self._paths_for(path)
+        if not os.path.isfile(data_path) or not os.path.isfile(meta_path):
+            return None
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            stat_key = list(_stat_key(path))
+            if meta["source"] != os.path.abspath(path):
+                return None
+            if meta["stat"] != stat_key:
+                if meta["sha256"] != _cached_file_fingerprint(path):
+                    logging.info(f"{path} was changed, its binary copy is invalid")
+                    return None
+                meta["stat"] = stat_key
+                self._write_meta(meta_path, meta)
+
+            if meta["format"] == "feather":
+                return pd.read_feather(data_path)
+            return pd.read_pickle(data_path)
+        except Exception:
+            logging.warning(f"Failed loading the binary copy of {path}", exc_info=True)
+            return None
+
+    def save(self, path, data):
+        """
+        Save a binary copy of a CSV file
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        data_path, meta_path = self._paths_for(path)
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        data_format = "feather" if self._has_pyarrow() else "pickle"
+        if data_format == "feather":
+            data.to_feather(tmp_path)
+        else:
+            data.to_pickle(tmp_path)
+        os.replace(tmp_path, data_path)
+        self._write_meta(meta_path, {"source": os.path.abspath(path),
+                                     "stat": list(_stat_key(path)),
+                                     "sha256": _cached_file_fingerprint(path),
+                                     "format": data_format})
+
+    @staticmethod
+    def _write_meta(meta_path, meta):
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+
+DEFAULT_DATA_CACHE = BinaryDataCache()
+
+
+def downcast(data):
+    """
+    Store every column of a frame in the smallest type that holds its values exactly: integers in the smallest
+    integer type, floats in float32 when none of them changes and text as categories (codes into its values).
+    Returns a new frame.
+    """
+    columns = {}
+    for col in data.columns:
+        values = data[col]
+        if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            columns[col] = values
+        elif pd.api.types.is_integer_dtype(values):
+            columns[col] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            compact = values.astype(np.float32)
+            same = np.array_equal(compact.to_numpy(dtype=values.dtype), values.to_numpy(), equal_nan=True)
+            columns[col] = compact if same else values
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            columns[col] = values.astype("category")
+        else:
+            columns[col] = values
+    return pd.DataFrame(columns, index=data.index)
+
+
+def memory_mb(data):
+    """
+    Get the memory of a frame or a series in MB, with the memory of the objects it holds
+    """
+    usage = data.memory_usage(deep=True, index=True)
+    return float(np.sum(usage)) / 2 ** 20
+
+
+def _read_csv(path, cache):
+    if cache:
+        with span("load_binary_data"):
+            data = cache.load(path)
+        if data is not None:
+            logging.info(f"Loaded the binary copy of {path}")
+            # Binary copies saved before the data was downcast are downcast now
+            return downcast(data)
+
+    with span("read_csv"):
+        data = downcast(pd.read_csv(path).fillna(0))
+    if cache:
+        try:
+            cache.save(path, data)
+        except Exception:
+            logging.warning(f"Failed saving a binary copy of {path}", exc_info=True)
+    return data
+
+
+def _read_appended(path, data, appended_path):
+    with span("read_appended_data"):
+        appended = pd.read_csv(appended_path)[list(data.columns)].fillna(0)
+    logging.info(f"Loaded {len(appended)} employees appended to {path} from {appended_path}")
+    appended.index = pd.RangeIndex(len(data), len(data) + len(appended))
+    return downcast(pd.concat([data, appended]))
+
+
+def load_data(path, cache=DEFAULT_DATA_CACHE, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load a CSV file with the employees appended to it (see append_data) once per process (as long as they are not
+    changed), with missing values as 0 and every column in the smallest type that holds its values (see downcast).
+    cache is the binary copy to load the file from, or None to always parse the CSV.
+    Every call returns a shallow copy, so columns can be added and removed without changing the shared data,
+    but the values themselves must not be changed in place.
+    """
+    appended_path = get_appended_path(path, cache_dir)
+    stat_key = (_stat_key(path), _stat_key(appended_path) if os.path.isfile(appended_path) else None)
+    with _lock:
+        loaded = _loaded_data.get(path)
+        if loaded is None or loaded[0] != stat_key:
+            data = _read_csv(path, cache)
+            if stat_key[1] is not None:
+                data = _read_appended(path, data, appended_path)
+            loaded = (stat_key, data)
+            _loaded_data[path] = loaded
+    return loaded[1].copy(deep=False)
+
+
+def drop_known_employees(path, new_data, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Get the rows of new_data whose employees (by ID_COL) are not in a CSV file or appended to it yet, so appending
+    the same employees again does not duplicate them
+    """
+    if ID_COL not in new_data.columns:
+        return new_data
+    known = new_data[ID_COL].isin(load_data(path, cache_dir=cache_dir)[ID_COL])
+    if known.any():
+        logging.warning(f"Skipping {int(known.sum())} employees that are already in the data")
+    return new_data[~known]
+
+
+def append_data(path, new_data, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Append rows to a CSV file, in the order of its columns. The file itself is never changed, the rows are appended
+    to an extract in cache_dir that load_data combines with it (and clear_appended_data removes).
+    """
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    missing_cols = [col for col in columns if col not in new_data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns: {missing_cols}")
+
+    appended_path = get_appended_path(path, cache_dir)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    exists = os.path.isfile(appended_path)
+    new_data[columns].to_csv(appended_path, mode="a" if exists else "w", header=not exists, index=False)
+
+
+def clear_appended_data(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Remove the employees appended to a CSV file, returns True if there were any
+    """
+    appended_path = get_appended_path(path, cache_dir)
+    if not os.path.isfile(appended_path):
+        return False
+    os.remove(appended_path)
+    return True
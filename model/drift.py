@@ -0,0 +1,288 @@
+"""
+Monitoring of the drift of the scored employees from the HR data the model was trained on.
+Every feature has a histogram of fixed bins over the encoded employees: numeric features are counted in bins between
+the deciles of the reference data (a bin per value for features with few values), and categorical features are
+counted by their codes. The bins stay those of the reference, so they measure the drift from it but are not quantile
+sketches: they cannot tell the quantiles of the scored employees. The histograms of different processes are merged by
+adding their counts, so monitoring runs at constant memory over any number of employees. The scored employees are
+compared to the reference by the population stability index (PSI) and the Kolmogorov-Smirnov statistic of every
+feature.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from model.encoder import UNKNOWN_CODE
+
+DRIFT_VERSION = 1
+DEFAULT_DRIFT_STATE = os.path.join("Monitoring", "drift.json")
+# Deciles, the PSI of k bins over n employees is about (k - 1) / n by chance alone, so more bins need more employees
+MAX_BINS = 10
+# Fraction added to every bin so PSI is finite for empty bins
+PSI_EPSILON = 1e-4
+# PSI of a feature from which its drift is moderate and major, the common rule of thumb
+MODERATE_PSI = 0.1
+MAJOR_PSI = 0.25
+# Fewest scored employees before drift is judged, and the shares that make a full retrain worth its cost
+MIN_ROWS = 500
+MAX_MODERATE_SHARE = 0.3
+MAX_UNKNOWN_SHARE = 0.01
+ACTIONS = ["none", "incremental", "full"]
+
+
+def _numeric_edges(values):
+    """
+    Get the bin edges of a numeric feature: every value is its own bin when there are few of them, otherwise the
+    bins are at the quantiles of the values
+    """
+    distinct = np.unique(values[~np.isnan(values)])
+    if len(distinct) <= MAX_BINS:
+        return distinct[1:]
+    return np.unique(np.quantile(values, np.linspace(0, 1, MAX_BINS + 1)[1:-1]))
+
+
+def psi(reference, current):
+    """
+    Get the population stability index of the counts of the bins of current relative to reference
+    """
+    reference = reference / max(reference.sum(), 1) + PSI_EPSILON
+    current = current / max(current.sum(), 1) + PSI_EPSILON
+    return float(np.sum((current - reference) * np.log(current / reference)))
+
+
+def ks(reference, current):
+    """
+    Get the Kolmogorov-Smirnov statistic of the counts of ordered bins: the largest difference of their cumulative
+    shares (exact for features whose every value is a bin, a lower bound otherwise)
+    """
+    if not reference.sum() or not current.sum():
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(reference) / reference.sum() - np.cumsum(current) / current.sum())))
+
+
+class FeatureHistogram(object):
+    """
+    Counts of the values of a feature: numeric features by the bins between edges, categorical features by their
+    codes (and one more count for unknown categories). Missing values and values out of the reference's range are
+    counted too.
+    """
+    def __init__(self, kind, edges=None, n_categories=None, low=None, high=None):
+        self.kind = kind
+        self.edges = None if edges is None else np.asarray(edges, dtype=float)
+        self.n_categories = n_categories
+        self.low, self.high = low, high
+        n_bins = len(self.edges) + 1 if kind == "numeric" else n_categories + 1
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.missing = 0
+        self.out_of_range = 0
+
+    def empty_like(self):
+        return FeatureHistogram(self.kind, self.edges, self.n_categories, self.low, self.high)
+
+    @property
+    def rows(self):
+        return int(self.counts.sum()) + self.missing
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        is_missing = np.isnan(values)
+        self.missing += int(is_missing.sum())
+        values = values[~is_missing]
+        if self.kind == "numeric":
+            self.out_of_range += int(((values < self.low) | (values > self.high)).sum())
+            self.counts += np.bincount(np.searchsorted(self.edges, values, side="right"), minlength=len(self.counts))
+        else:
+            # Unknown categories (and codes that are not categories at all) are counted in the last bin
+            codes = values.astype(np.int64)
+            codes[(codes < 0) | (codes >= self.n_categories) | (codes == UNKNOWN_CODE)] = self.n_categories
+            self.counts += np.bincount(codes, minlength=len(self.counts))
+
+    def merge(self, other):
+        if self.kind != other.kind or len(self.counts) != len(other.counts):
+            raise ValueError("Only histograms of the same reference can be merged")
+        self.counts += other.counts
+        self.missing += other.missing
+        self.out_of_range += other.out_of_range
+
+    def to_dict(self):
+        return {"kind": self.kind, "edges": None if self.edges is None else self.edges.tolist(),
+                "n_categories": self.n_categories, "low": self.low, "high": self.high,
+                "counts": self.counts.tolist(), "missing": self.missing, "out_of_range": self.out_of_range}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = cls(state["kind"], state["edges"], state["n_categories"], state["low"], state["high"])
+        histogram.counts = np.asarray(state["counts"], dtype=np.int64)
+        histogram.missing = state["missing"]
+        histogram.out_of_range = state["out_of_range"]
+        return histogram
+
+
+class DriftMonitor(object):
+    """
+    Sketches of the reference data and of the scored employees, by feature.
+    fingerprint identifies the reference data, only monitors of the same reference can be merged.
+    """
+    def __init__(self, x_cols, reference, current=None, fingerprint=None):
+        self.x_cols = list(x_cols)
+        self.reference = reference
+        self.current = current or {col: histogram.empty_like() for col, histogram in reference.items()}
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_data(cls, x, x_cols, categories, fingerprint=None):
+        """
+        Create a monitor with the encoded matrix x as its reference, categories are the categories of the
+        categorical features by their names
+        """
+        x = np.asarray(x, dtype=float)
+        reference = {}
+        for i, col in enumerate(x_cols):
+            values = x[:, i]
+            if col in categories:
+                histogram = FeatureHistogram("categorical", n_categories=len(categories[col]))
+            else:
+                histogram = FeatureHistogram("numeric", _numeric_edges(values), low=float(np.nanmin(values)),
+                                             high=float(np.nanmax(values)))
+            histogram.update(values)
+            reference[col] = histogram
+        return cls(x_cols, reference, fingerprint=fingerprint)
+
+    @property
+    def rows(self):
+        return self.current[self.x_cols[0]].rows if self.x_cols else 0
+
+    def update(self, x):
+        """
+        Add a batch of scored employees, as an encoded matrix in the order of x_cols
+        """
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 1:
+            x = x[None, :]
+        with self._lock:
+            for i, col in enumerate(self.x_cols):
+                self.current[col].update(x[:, i])
+
+    def merge(self, other):
+        """
+        Add the scored employees of another monitor of the same reference
+        """
+        if other.fingerprint != self.fingerprint or other.x_cols != self.x_cols:
+            raise ValueError("Only monitors of the same reference data and features can be merged")
+        with self._lock:
+            for col in self.x_cols:
+                self.current[col].merge(other.current[col])
+
+    def reset(self):
+        with self._lock:
+            self.current = {col: histogram.empty_like() for col, histogram in self.reference.items()}
+
+    def report(self):
+        """
+        Get the drift of every feature: its PSI, KS statistic (for numeric features), and its shares of missing,
+        out of range and unknown values
+        """
+        features = {}
+        with self._lock:
+            for col in self.x_cols:
+                reference, current = self.reference[col], self.current[col]
+                rows = max(current.rows, 1)
+                feature = {"psi": psi(reference.counts, current.counts), "missing": current.missing / rows}
+                if current.kind == "numeric":
+                    feature["ks"] = ks(reference.counts, current.counts)
+                    feature["out_of_range"] = current.out_of_range / rows
+                else:
+                    feature["unknown"] = float(current.counts[-1]) / rows
+                features[col] = feature
+        return {"rows": self.rows, "features": features, "recommendation": self.recommend(features)}
+
+    def recommend(self, features=None):
+        """
+        Decide whether retraining is worth its cost: "full" when categories the model never saw appear or the drift
+        is major or wide, "incremental" (updating the model with new employees) when some features drifted
+        moderately, and "none" otherwise or before MIN_ROWS employees were scored.
+        Returns the action and its reason.
+        """
+        features = features or self.report()["features"]
+        rows = self.rows
+        if rows < MIN_ROWS:
+            return {"action": "none", "reason": f"only {rows} of {MIN_ROWS} employees needed were scored"}
+        unknown = [col for col, feature in features.items() if feature.get("unknown", 0) > MAX_UNKNOWN_SHARE]
+        if unknown:
+            # Updating a model with unknown categories trains it from scratch anyway
+            return {"action": "full", "reason": f"unknown categories in {unknown}"}
+        major = [col for col, feature in features.items() if feature["psi"] >= MAJOR_PSI]
+        if major:
+            return {"action": "full", "reason": f"major drift (PSI >= {MAJOR_PSI}) of {major}"}
+        moderate = [col for col, feature in features.items() if feature["psi"] >= MODERATE_PSI]
+        if len(moderate) > MAX_MODERATE_SHARE * len(features):
+            return {"action": "full", "reason": f"moderate drift of {len(moderate)} of {len(features)} features"}
+        if moderate:
+            return {"action": "incremental", "reason": f"moderate drift (PSI >= {MODERATE_PSI}) of {moderate}"}
+        return {"action": "none", "reason": "no feature drifted"}
+
+    def to_dict(self):
+        with self._lock:
+            return {"version": DRIFT_VERSION, "sha256": self.fingerprint, "x_cols": self.x_cols,
+                    "reference": {col: histogram.to_dict() for col, histogram in self.reference.items()},
+                    "current": {col: histogram.to_dict() for col, histogram in self.current.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        if state["version"] != DRIFT_VERSION:
+            raise ValueError(f"Unknown drift state version {state['version']}")
+        reference = {col: FeatureHistogram.from_dict(histogram) for col, histogram in state["reference"].items()}
+        current = {col: FeatureHistogram.from_dict(histogram) for col, histogram in state["current"].items()}
+        return cls(state["x_cols"], reference, current, state["sha256"])
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def create_monitor(model, data, fingerprint=None):
+    """
+    Create a monitor of the features of a trained HREmployeeAttritionModel or CompiledModel, with the HR data as its
+    reference
+    """
+    categories = model.encoder.categories if hasattr(model, "encoder") else model.meta["encoder"]["categories"]
+    return DriftMonitor.from_data(model.fit_frame(data), model.x_cols,
+                                  {col: categories[col] for col in model.x_cols if col in categories}, fingerprint)
+
+
+def load_monitor(path, model, data, fingerprint):
+    """
+    Load the monitor saved in path if it has the same reference, otherwise create a new one
+    """
+    if os.path.isfile(path):
+        try:
+            monitor = DriftMonitor.load(path)
+            if monitor.fingerprint == fingerprint and monitor.x_cols == list(model.x_cols):
+                return monitor
+            logging.info(f"The reference data changed since {path} was saved, monitoring starts over")
+        except Exception:
+            logging.warning(f"Failed loading the drift state from {path}, monitoring starts over", exc_info=True)
+    return create_monitor(model, data, fingerprint)
+
+
+def log_report(report):
+    drifted = sorted(((feature["psi"], col) for col, feature in report["features"].items()
+                      if feature["psi"] >= MODERATE_PSI), reverse=True)
+    logging.info(f"Drift over {report['rows']} scored employees: " +
+                 (", ".join(f"{col} PSI {val:.3f}" for val, col in drifted) or "no feature drifted"))
+    recommendation = report["recommendation"]
+    logging.info(f"Retraining: {recommendation['action']} ({recommendation['reason']})")
@@ -0,0 +1,148 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLS = ["Attrition", "BusinessTravel", "Department", "EducationField", "Gender", "JobRole",
+                    "MaritalStatus", "Over18", "OverTime"]
+UNKNOWN_POLICIES = ["error", "ignore", "most_frequent"]
+UNKNOWN_CODE = -1
+
+
+def _is_categorical(values):
+    return isinstance(getattr(values, "dtype", None), pd.CategoricalDtype)
+
+
+def _value_counts(values):
+    """
+    Count the values of a column as text, a categorical column is counted by its codes and only its categories
+    are converted to text
+    """
+    counts = values.value_counts(sort=False)
+    if _is_categorical(values):
+        counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    return counts
+
+
+class CategoricalEncoder(object):
+    """
+    Encoder of the categorical columns, every category gets its index in the sorted categories of its column.
+    unknown is what to do with categories that were not seen while fitting:
+    "error" raises a ValueError, "ignore" encodes them as UNKNOWN_CODE and "most_frequent" encodes them as
+    the most frequent category of the column.
+    """
+    def __init__(self, cols=CATEGORICAL_COLS, unknown="ignore"):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"Unknown policy '{unknown}', should be one of: {UNKNOWN_POLICIES}")
+        self.cols = list(cols)
+        self.unknown = unknown
+        self.categories = {}
+        self.most_frequent = {}
+        self._indexes = {}
+
+    def fit(self, data):
+        """
+        Fit the encoder over the categorical columns of a frame
+        """
+        self.categories = {}
+        self.most_frequent = {}
+        for col in self.cols:
+            if col in data.columns:
+                counts = _value_counts(data[col])
+                self.categories[col] = sorted(counts.index.tolist())
+                self.most_frequent[col] = min(counts.index[counts == counts.max()])
+        self._indexes = {}
+        return self
+
+    def _index(self, col):
+        if col not in self._indexes:
+            self._indexes[col] = pd.Index(self.categories[col])
+        return self._indexes[col]
+
+    def __contains__(self, col):
+        return col in self.categories
+
+    def _handle_unknown(self, col, values, codes):
+        unknown = codes == UNKNOWN_CODE
+        if not unknown.any():
+            return codes
+        if self.unknown == "error":
+            raise ValueError(f"Unknown values in {col}: {sorted(set(np.asarray(values)[unknown]))}")
+        if self.unknown == "most_frequent":
+            codes = codes.copy()
+            codes[unknown] = self.categories[col].index(self.most_frequent[col])
+        return codes
+
+    def encode(self, col, values):
+        """
+        Encode values of a column
+        """
+        if _is_categorical(values):
+            # Only the categories are looked up, the rows get the codes of their categories
+            category_codes = self._index(col).get_indexer(values.cat.categories.astype(str))
+            codes = np.append(category_codes, UNKNOWN_CODE)[values.cat.codes.to_numpy()]
+            return self._handle_unknown(col, values, codes)
+        values = pd.Series(values).astype(str).to_numpy()
+        codes = self._index(col).get_indexer(values)
+        return self._handle_unknown(col, values, codes)
+
+    def decode(self, col, codes):
+        """
+        Get the original values of encoded values of a column
+        """
+        categories = np.asarray(self.categories[col] + [None], dtype=object)
+        return categories[np.asarray(codes, dtype=int)]
+
+    def transform(self, data):
+        """
+        Encode the categorical columns of a frame to the smallest integer type that holds their codes,
+        returns a new frame that shares the other columns
+        """
+        data = data.copy(deep=False)
+        for col in self.categories:
+            if col in data.columns:
+                data[col] = self.encode(col, data[col]).astype(np.min_scalar_type(-len(self.categories[col])))
+        return data
+
+    def transform_record(self, record: dict):
+        """
+        Encode the categorical values of a single record, returns a new record
+        """
+        result = dict(record)
+        for col, val in record.items():
+            if col in self.categories:
+                result[col] = int(self.encode(col, [val])[0])
+        return result
+
+    def to_dict(self):
+        return {"cols": self.cols, "unknown": self.unknown, "categories": self.categories,
+                "most_frequent": self.most_frequent}
+
+    @classmethod
+    def from_dict(cls, state):
+        encoder = cls(state["cols"], state["unknown"])
+        encoder.categories = {col: list(categories) for col, categories in state["categories"].items()}
+        encoder.most_frequent = dict(state["most_frequent"])
+        return encoder
+
+    def save(self, path):
+        """
+        Save the encoder as JSON
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an encoder saved by save
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__dict__.update(CategoricalEncoder.from_dict(state).__dict__)
@@ -0,0 +1,66 @@
+"""
+Ensembles defined by JSON config files instead of CLASSIFIERS, for example:
+{"voting": "hard", "cascade_accuracy_drop": 0.01,
+ "classifiers": {"XGBClassifier": {"module": "xgboost", "class": "XGBClassifier", "params": {"n_estimators": 1000},
+                                   "weight": 1, "enabled": true, "latency_budget_ms": 10}}}
+Only module and class are required. A classifier may also be given as [module, class, params] like CLASSIFIERS, so
+the candidates of search.py are configs too, and so is the output of search.py (its most accurate ensemble).
+"""
+import json
+
+from model import VOTING_TYPES
+
+ENSEMBLE_KEYS = {"voting", "cascade_accuracy_drop", "classifiers"}
+CLASSIFIER_KEYS = {"module", "class", "params", "weight", "enabled", "latency_budget_ms"}
+
+
+def _parse_classifier(name, classifier):
+    if isinstance(classifier, list):
+        module, class_name, params = classifier
+        classifier = {"module": module, "class": class_name, "params": params}
+    unknown = set(classifier) - CLASSIFIER_KEYS
+    if unknown:
+        raise ValueError(f"Unknown settings of classifier {name}: {sorted(unknown)}, should be of: "
+                         f"{sorted(CLASSIFIER_KEYS)}")
+    if "module" not in classifier or "class" not in classifier:
+        raise ValueError(f"Classifier {name} must have a module and a class")
+    return classifier
+
+
+def parse_ensemble(config):
+    """
+    Get the keyword arguments of HREmployeeAttritionModel that define the ensemble of a config
+    """
+    if "pareto_front" in config:
+        config = config["pareto_front"][0]
+    if "candidate" in config:
+        config = {"classifiers": config["candidate"]}
+    unknown = set(config) - ENSEMBLE_KEYS
+    if unknown:
+        raise ValueError(f"Unknown settings of the ensemble: {sorted(unknown)}, should be of: {sorted(ENSEMBLE_KEYS)}")
+    classifiers = {name: _parse_classifier(name, classifier)
+                   for name, classifier in config.get("classifiers", {}).items()}
+    classifiers = {name: classifier for name, classifier in classifiers.items() if classifier.get("enabled", True)}
+    if not classifiers:
+        raise ValueError("The ensemble must have at least one enabled classifier")
+
+    kwargs = {"classifier_specs": {name: (classifier["module"], classifier["class"], classifier.get("params", {}))
+                                   for name, classifier in classifiers.items()},
+              "weights": {name: float(classifier.get("weight", 1.0)) for name, classifier in classifiers.items()},
+              "latency_budgets": {name: classifier["latency_budget_ms"] for name, classifier in classifiers.items()
+                                  if classifier.get("latency_budget_ms") is not None}}
+    if "voting" in config:
+        if config["voting"] not in VOTING_TYPES:
+            raise ValueError(f"Unknown voting '{config['voting']}', should be one of: {VOTING_TYPES}")
+        kwargs["voting"] = config["voting"]
+    if "cascade_accuracy_drop" in config:
+        kwargs["cascade_accuracy_drop"] = float(config["cascade_accuracy_drop"])
+    return kwargs
+
+
+def load_ensemble(path):
+    """
+    Load the ensemble of a JSON config file, returns the keyword arguments of HREmployeeAttritionModel
+    """
+    with open(path) as f:
+        return parse_ensemble(json.load(f))
@@ -0,0 +1,67 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# full evaluates over the train and test sets, test only over the test set, subsample over a sample of each of them,
+# deferred over the train and test sets in a background thread, and off does not evaluate at all
+EVALUATION_POLICIES = ["full", "test", "subsample", "deferred", "off"]
+DEFAULT_EVALUATION_ROWS = 300
+
+_executor = None
+
+
+def get_background_executor():
+    """
+    Get the single background thread that deferred evaluations run in
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="evaluation")
+    return _executor
+
+
+def predict_scores(model, x):
+    """
+    Predict the probabilities of the classes with a classifier, or its predictions if it has no probabilities.
+    Both the predictions and the metrics are taken from this single pass.
+    """
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(x)
+    return model.predict(x)
+
+
+def get_metrics(y, scores, classes):
+    """
+    Get the accuracy, and for 2 classes the precision, recall, f1 and AUC of the positive class,
+    of scores returned by predict_scores
+    """
+    from sklearn.metrics import accuracy_score, precision_recall_fscore_support, roc_auc_score
+
+    y = np.asarray(y)
+    scores = np.asarray(scores)
+    predictions = classes[scores.argmax(axis=1)] if scores.ndim == 2 else scores
+    metrics = {"rows": len(y), "accuracy": float(accuracy_score(y, predictions))}
+    if len(classes) == 2:
+        precision, recall, f1, _ = precision_recall_fscore_support(y, predictions, pos_label=classes[1],
+                                                                   average="binary", zero_division=0)
+        metrics.update(precision=float(precision), recall=float(recall), f1=float(f1))
+        if scores.ndim == 2 and len(np.unique(y)) == 2:
+            metrics["auc"] = float(roc_auc_score(y == classes[1], scores[:, 1]))
+    return metrics
+
+
+def subsample(x, y, n_rows, seed=0):
+    """
+    Get a random sample of at most n_rows rows of x and y
+    """
+    if len(x) <= n_rows:
+        return x, y
+    indexes = np.random.RandomState(seed).choice(len(x), n_rows, replace=False)
+    return x.iloc[indexes], y.iloc[indexes]
+
+
+def log_metrics(model_name, split, metrics):
+    text = ", ".join(f"{name} {val:.3f}" if isinstance(val, float) else f"{name} {val}"
+                     for name, val in metrics.items())
+    logging.info(f"{split.capitalize()} metrics for {model_name}: {text}")
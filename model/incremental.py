@@ -0,0 +1,35 @@
+import logging
+
+DEFAULT_FULL_TRAIN_EVERY = 4
+DEFAULT_MAX_ACCURACY_DROP = 0.05
+
+
+def get_new_estimators(n_estimators, new_rows, total_rows):
+    """
+    Get the number of estimators to add for new rows, by the share of the new rows in all the rows
+    """
+    return max(1, round(n_estimators * new_rows / total_rows))
+
+
+def warm_start_classifier(model_name, model, x, y, new_rows):
+    """
+    Train a fitted classifier over its data with new rows (the last new_rows of x and y) without starting over.
+    Forests and bagging add trees, XGBoost continues boosting and anything else is fitted again.
+    The parameters of the classifier are left as they were, so it is still stored under the same key.
+    """
+    params = model.get_params()
+    if hasattr(model, "get_booster"):
+        new_estimators = get_new_estimators(params["n_estimators"], new_rows, len(x))
+        logging.info(f"Boosting {model_name} for {new_estimators} more rounds")
+        model.set_params(n_estimators=new_estimators)
+        model.fit(x, y, xgb_model=model.get_booster())
+    elif "warm_start" in params and hasattr(model, "estimators_"):
+        current_estimators = len(model.estimators_)
+        new_estimators = get_new_estimators(current_estimators, new_rows, len(x))
+        logging.info(f"Adding {new_estimators} estimators to {model_name}")
+        model.set_params(warm_start=True, n_estimators=current_estimators + new_estimators)
+        model.fit(x, y)
+    else:
+        logging.info(f"Fitting {model_name} again")
+        model.fit(x, y)
+    model.set_params(**{param: params[param] for param in ("n_estimators", "warm_start") if param in params})
@@ -0,0 +1,219 @@
+"""
+Span timers around the stages of the app.
+Spans are recorded only after enable() is called, or when the HR_INSTRUMENTATION environment variable is set
+("1" for times, "memory" for times and memory). When HR_INSTRUMENTATION_OUTPUT is set too, the spans are exported
+to it when the process exits, as JSON or as Prometheus text (for files ending with .prom).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+MAX_SPANS = 100000
+ENV_VAR = "HR_INSTRUMENTATION"
+OUTPUT_ENV_VAR = "HR_INSTRUMENTATION_OUTPUT"
+
+_enabled = False
+_trace_memory = False
+_spans = deque(maxlen=MAX_SPANS)
+_totals = defaultdict(lambda: [0, 0.0])
+_lock = threading.Lock()
+_local = threading.local()
+_start_time = time.perf_counter()
+
+
+def get_rss_mb():
+    """
+    Get the resident memory of the process in MB, None if it is not known
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def enable(trace_memory=False):
+    """
+    Start recording spans, with trace_memory the python memory and resident memory are recorded too
+    """
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Stop recording spans
+    """
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    """
+    Remove all the recorded spans
+    """
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+
+
+def _labels_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def record(name, seconds, **labels):
+    """
+    Record a span that was measured elsewhere (for example in another process)
+    """
+    if not _enabled:
+        return
+    stack = getattr(_local, "stack", [])
+    _add({"name": name, "labels": labels, "start": None, "seconds": seconds,
+          "parent": stack[-1] if stack else None, "thread": threading.current_thread().name})
+
+
+def _add(result):
+    with _lock:
+        _spans.append(result)
+        totals = _totals[_labels_key(result["name"], result["labels"])]
+        totals[0] += 1
+        totals[1] += result["seconds"]
+
+
+class _Span(object):
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        if _trace_memory:
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        _local.stack.pop()
+        result = {"name": self.name, "labels": self.labels, "start": self.start - _start_time, "seconds": seconds,
+                  "parent": self.parent, "thread": threading.current_thread().name}
+        if _trace_memory:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            result["traced_memory_delta_mb"] = (traced - self.traced_start) / 2 ** 20
+            result["traced_memory_peak_mb"] = traced_peak / 2 ** 20
+            result["rss_mb"] = get_rss_mb()
+        _add(result)
+        return False
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **labels):
+    """
+    Time the code in a with block as a span with the given name and labels
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, labels)
+
+
+def get_spans():
+    with _lock:
+        return list(_spans)
+
+
+def get_totals():
+    """
+    Get the number of spans and their total seconds by their name and labels
+    """
+    with _lock:
+        return {key: tuple(val) for key, val in _totals.items()}
+
+
+def export_json(path):
+    """
+    Export the recorded spans and their totals as JSON
+    """
+    totals = [{"name": name, "labels": dict(labels), "count": count, "seconds": seconds}
+              for (name, labels), (count, seconds) in get_totals().items()]
+    with open(path, "w") as f:
+        json.dump({"spans": get_spans(), "totals": totals}, f, indent=2)
+
+
+def _escape(val):
+    return str(val).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def export_prometheus(path):
+    """
+    Export the totals of the recorded spans in the Prometheus text format
+    """
+    lines = ["# HELP hr_span_seconds_total Total seconds spent in a span",
+             "# TYPE hr_span_seconds_total counter",
+             "# HELP hr_span_count_total Number of times a span ran",
+             "# TYPE hr_span_count_total counter"]
+    for (name, labels), (count, seconds) in sorted(get_totals().items()):
+        label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in (("span", name),) + labels)
+        lines.append(f"hr_span_seconds_total{{{label_text}}} {seconds}")
+        lines.append(f"hr_span_count_total{{{label_text}}} {count}")
+    rss = get_rss_mb()
+    if rss is not None:
+        lines += ["# HELP hr_resident_memory_megabytes Resident memory of the process",
+                  "# TYPE hr_resident_memory_megabytes gauge",
+                  f"hr_resident_memory_megabytes {rss}"]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def export(path):
+    """
+    Export the recorded spans, as Prometheus text for files ending with .prom and as JSON otherwise
+    """
+    if path.endswith(".prom"):
+        export_prometheus(path)
+    else:
+        export_json(path)
+
+
+def _enable_from_environment():
+    mode = os.environ.get(ENV_VAR)
+    if not mode or mode == "0":
+        return
+    enable(trace_memory=mode == "memory")
+    output = os.environ.get(OUTPUT_ENV_VAR)
+    if output:
+        atexit.register(export, output)
+
+
+_enable_from_environment()
@@ -0,0 +1,126 @@
+"""
+Nearest neighbours classifier of the ensemble, with the scaling of the features built in.
+The index of the train set is built once when fitting and is pickled with the classifier. It is a KD tree for large
+train sets, and a blocked brute force search (a matrix product per block of queries) for small train sets, where
+it is faster than any tree. Queries are searched in blocks, in threads when n_jobs allows it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from model.parallel import get_n_jobs
+
+ALGORITHMS = ["auto", "brute", "kd_tree", "ball_tree"]
+# Measured on the HR data synthesized to 5k-200k rows: brute force is faster up to about 20k rows, the KD tree
+# queries in about the same time for any number of rows, and the ball tree is slower than both
+BRUTE_MAX_ROWS = 20000
+KD_TREE_MAX_FEATURES = 40
+# Most distances a block of queries computes at once with brute force
+MAX_BLOCK_DISTANCES = 2 ** 22
+
+
+def choose_algorithm(n_samples, n_features):
+    """
+    Choose the index of a train set by its size and dimensionality
+    """
+    if n_samples <= BRUTE_MAX_ROWS or n_features > KD_TREE_MAX_FEATURES:
+        return "brute"
+    return "kd_tree"
+
+
+class ScaledKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+    """
+    K nearest neighbours classifier over the euclidean distances of standardized features (when scaling is True).
+    weights is "uniform" for a majority vote of the neighbours or "distance" to weight them by their inverse
+    distance, algorithm is the index of the train set (one of ALGORITHMS, "auto" chooses it by choose_algorithm).
+    """
+    def __init__(self, n_neighbors=5, weights="uniform", scaling=True, algorithm="auto", leaf_size=40, n_jobs=None):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.scaling = scaling
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.n_jobs = n_jobs
+
+    def _scale(self, x):
+        return (np.asarray(x, dtype=np.float64) - self.mean_) / self.scale_
+
+    def fit(self, x, y):
+        from sklearn.neighbors import BallTree, KDTree
+
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{self.algorithm}', should be one of: {ALGORITHMS}")
+        if self.weights not in ("uniform", "distance"):
+            raise ValueError(f"Unknown weights '{self.weights}', should be uniform or distance")
+        if hasattr(x, "columns"):
+            self.feature_names_in_ = np.asarray(x.columns, dtype=object)
+        x = np.asarray(x, dtype=np.float64)
+        self.n_features_in_ = x.shape[1]
+        self.classes_, self.fit_y_ = np.unique(np.asarray(y), return_inverse=True)
+        if self.scaling:
+            self.mean_ = x.mean(axis=0)
+            scale = x.std(axis=0)
+            # Constant features are only centered
+            self.scale_ = np.where(scale > 0, scale, 1.0)
+        else:
+            self.mean_, self.scale_ = np.zeros(x.shape[1]), np.ones(x.shape[1])
+        self.fit_x_ = self._scale(x)
+
+        self.algorithm_ = choose_algorithm(*x.shape) if self.algorithm == "auto" else self.algorithm
+        if self.algorithm_ == "kd_tree":
+            self.index_ = KDTree(self.fit_x_, leaf_size=self.leaf_size)
+        elif self.algorithm_ == "ball_tree":
+            self.index_ = BallTree(self.fit_x_, leaf_size=self.leaf_size)
+        else:
+            self.index_ = None
+            self.fit_sq_norms_ = (self.fit_x_ ** 2).sum(axis=1)
+        return self
+
+    def _search_block(self, block, k):
+        if self.index_ is not None:
+            return self.index_.query(block, k=k)
+        # Squared euclidean distances by |a - b|^2 = |a|^2 - 2ab + |b|^2, a single matrix product for the block
+        distances = self.fit_sq_norms_ - 2 * block @ self.fit_x_.T + (block ** 2).sum(axis=1)[:, None]
+        neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        neighbor_distances = np.take_along_axis(distances, neighbors, axis=1)
+        order = np.argsort(neighbor_distances, axis=1)
+        return (np.sqrt(np.maximum(np.take_along_axis(neighbor_distances, order, axis=1), 0)),
+                np.take_along_axis(neighbors, order, axis=1))
+
+    def kneighbors(self, x, n_neighbors=None):
+        """
+        Get the distances and indexes of the nearest neighbours of every row of x in the train set, nearest first
+        """
+        k = min(n_neighbors or self.n_neighbors, len(self.fit_x_))
+        x = self._scale(x)
+        rows_per_block = max(1, MAX_BLOCK_DISTANCES // len(self.fit_x_))
+        blocks = [x[start:start + rows_per_block] for start in range(0, len(x), rows_per_block)]
+        if not blocks:
+            return np.zeros((0, k)), np.zeros((0, k), dtype=int)
+        workers = min(get_n_jobs(self.n_jobs or 1), len(blocks))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda block: self._search_block(block, k), blocks))
+        else:
+            results = [self._search_block(block, k) for block in blocks]
+        return np.concatenate([distances for distances, _ in results]), \
+            np.concatenate([neighbors for _, neighbors in results])
+
+    def predict_proba(self, x):
+        distances, neighbors = self.kneighbors(x)
+        if self.weights == "distance":
+            with np.errstate(divide="ignore"):
+                weights = 1 / distances
+            # Rows with exact matches are voted by them only
+            exact = np.isinf(weights)
+            exact_rows = exact.any(axis=1)
+            weights[exact_rows] = exact[exact_rows]
+        else:
+            weights = np.ones(neighbors.shape)
+        probas = np.zeros((len(neighbors), len(self.classes_)))
+        np.add.at(probas, (np.arange(len(neighbors))[:, None], self.fit_y_[neighbors]), weights)
+        return probas / probas.sum(axis=1, keepdims=True)
+
+    def predict(self, x):
+        return self.classes_[self.predict_proba(x).argmax(axis=1)]
@@ -0,0 +1,111 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+def get_n_jobs(n_jobs):
+    """
+    Get the actual number of workers for a given n_jobs (-1 means all the cores)
+    """
+    cpu_count = os.cpu_count() or 1
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpu_count + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def split_n_jobs(classifiers, n_jobs):
+    """
+    Split a budget of n_jobs cores between the classifiers.
+    Each classifier gets its own worker, and the cores left are given to the classifiers that can use them
+    by their number of estimators, so running all of them together uses at most n_jobs cores.
+    Returns the number of workers and the n_jobs of every classifier.
+    """
+    workers = min(n_jobs, len(classifiers))
+    classifiers_n_jobs = {model_name: 1 for model_name in classifiers}
+    if workers == len(classifiers):
+        weights = {model_name: getattr(model, "n_estimators", 1)
+                   for model_name, model in classifiers.items()
+                   if "n_jobs" in model.get_params()}
+        spare_jobs = n_jobs - workers
+        total_weight = sum(weights.values())
+        if spare_jobs and total_weight:
+            shares = {model_name: spare_jobs * weight / total_weight for model_name, weight in weights.items()}
+            for model_name, share in shares.items():
+                classifiers_n_jobs[model_name] += int(share)
+            left = spare_jobs - sum(int(share) for share in shares.values())
+            by_remainder = sorted(shares, key=lambda model_name: shares[model_name] - int(shares[model_name]),
+                                  reverse=True)
+            for model_name in by_remainder[:left]:
+                classifiers_n_jobs[model_name] += 1
+    return workers, classifiers_n_jobs
+
+
+def set_n_jobs(model, n_jobs):
+    """
+    Set n_jobs of a classifier, if it supports it
+    """
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+
+
+def fit_classifier(model_name, model, x, y):
+    """
+    Fit a classifier and measure it, used as the target of the training workers.
+    Inner parallelism runs in threads, so its cpu time is counted for this classifier.
+    """
+    from joblib import parallel_backend
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    with parallel_backend("threading"):
+        model.fit(x, y)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    return model_name, model, wall, cpu
+
+
+def log_timing(model_name, stage, wall, cpu, n_jobs):
+    """
+    Log the wall-clock, cpu time and cpu utilisation of a classifier
+    """
+    utilisation = cpu / (wall * n_jobs) if wall else 0.0
+    logging.info(f"{stage} {model_name}: wall {wall:.3f}s, cpu {cpu:.3f}s, "
+                 f"{n_jobs} jobs, utilisation {utilisation:.0%}")
+    return {"wall": wall, "cpu": cpu, "n_jobs": n_jobs, "utilisation": utilisation}
+
+
+def fit_in_processes(classifiers, x, y, workers):
+    """
+    Fit all the classifiers at the same time in a pool of processes.
+    Yields the name, fitted classifier, wall-clock and cpu time of every classifier as it finishes.
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(fit_classifier, model_name, model, x, y)
+                   for model_name, model in classifiers.items()]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # When stopped early, the classifiers that did not start yet are not trained
+            for future in futures:
+                future.cancel()
+
+
+def predict_in_threads(classifiers, data, workers, method="predict"):
+    """
+    Predict with all the classifiers at the same time in a pool of threads.
+    method is the name of the predicting method of the classifiers (predict or predict_proba).
+    Returns the predictions, the wall-clock and the cpu time of every classifier. The cpu time is of the thread that
+    predicted with the classifier, so threads the classifier starts itself are not counted.
+    """
+    def predict(model):
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        prediction = getattr(model, method)(data)
+        return prediction, time.perf_counter() - start_wall, time.thread_time() - start_cpu
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(predict, classifiers.values())
+        return {model_name: result for model_name, result in zip(classifiers, results)}
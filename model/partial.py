@@ -0,0 +1,96 @@
+"""
+Predictions for employees that miss some of their features, without training a model for every set of missing
+features. The sets of missing features of the queries are logged, and models without the most common sets are
+trained ahead of time (by precompute.py). A query is predicted by the model without its missing features when
+there is one, and by the model of all the features over imputed values otherwise, so no query waits for training.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from model import HREmployeeAttritionModel, UNUSED_COLS
+
+DEFAULT_QUERY_LOG = os.path.join("QueryLog", "missing_features.jsonl")
+DEFAULT_MAX_SUBSET_MODELS = 4
+
+
+class QueryLog(object):
+    """
+    Log of the features that were missing in every query, as JSON lines
+    """
+    def __init__(self, path=DEFAULT_QUERY_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, missing_cols):
+        directory = os.path.dirname(self.path)
+        with self._lock:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"missing": sorted(missing_cols)}) + "\n")
+
+    def most_common(self, n):
+        """
+        Get the n most common sets of missing features (queries that missed none are not counted)
+        """
+        if not os.path.isfile(self.path):
+            return []
+        counts = Counter()
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    missing = json.loads(line)["missing"]
+                except (ValueError, KeyError):
+                    continue
+                if missing:
+                    counts[tuple(missing)] += 1
+        return [list(missing) for missing, _ in counts.most_common(n)]
+
+
+def create_subset_model(missing_cols, **kwargs):
+    """
+    Create a model over all the features except the unused ones and missing_cols, kwargs are passed to the model
+    """
+    model = HREmployeeAttritionModel(**kwargs)
+    for col in list(UNUSED_COLS) + list(missing_cols):
+        if col in model.hr_retention_data.columns:
+            del model.hr_retention_data[col]
+    return model
+
+
+def get_partial_model(registry, model, vals):
+    """
+    Get the model to predict for an employee that may miss some features, and its record for that model.
+    model is the trained model of all the features. If a model without the missing features was trained ahead of
+    time it is loaded from the registry, otherwise the missing features are imputed for model.
+    """
+    missing_cols = [col for col in model.x_cols if col not in vals]
+    if not missing_cols:
+        return model, {col: vals[col] for col in model.x_cols}
+
+    subset_model = create_subset_model(missing_cols, n_jobs=model.n_jobs, voting=model.voting, weights=model.weights,
+                                       classifier_names=list(model.classifiers),
+                                       classifier_specs=model.classifier_specs, latency_budgets=model.latency_budgets,
+                                       cascade_accuracy_drop=model.cascade_accuracy_drop)
+    if registry.load(subset_model):
+        logging.info(f"Predicting with the model without {missing_cols}")
+        return subset_model, {col: vals[col] for col in subset_model.x_cols}
+    logging.info(f"Predicting with imputed {missing_cols}")
+    return model, model.impute(vals)
+
+
+def precompute_models(registry, query_log, max_models=DEFAULT_MAX_SUBSET_MODELS, **kwargs):
+    """
+    Train the model of all the features and the models without the max_models most common sets of missing features
+    in the query log, unless they were already trained. kwargs are passed to the models.
+    Returns the sets of missing features that have a model.
+    """
+    registry.train(create_subset_model([], **kwargs))
+    subsets = query_log.most_common(max_models)
+    for i, missing_cols in enumerate(subsets):
+        logging.info(f"Training the model without {missing_cols} ({i + 1}/{len(subsets)})")
+        registry.train(create_subset_model(missing_cols, **kwargs))
+    return subsets
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from model import DATA_PATH
+from model.dataset import get_fingerprint, append_data, drop_known_employees
+from model.instrumentation import span
+
+DEFAULT_REGISTRY_DIR = "TrainedModels"
+DEFAULT_MAX_MODELS = 8
+
+
+class ModelRegistry(object):
+    """
+    Registry of trained models, keyed by the dataset and the features the model was trained on.
+    Keeps the most recently used models in memory and all of them on disk.
+    """
+    def __init__(self, directory=DEFAULT_REGISTRY_DIR, max_models=DEFAULT_MAX_MODELS, data_path=DATA_PATH):
+        self.directory = directory
+        self.max_models = max_models
+        self.data_path = data_path
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dataset_fingerprint(self):
+        """
+        Get the fingerprint of the dataset, it is recalculated only when the file changes
+        """
+        return get_fingerprint(self.data_path)
+
+    def key_for(self, model):
+        """
+        Get the registry key of a model by its state version, dataset, features and classifiers
+        """
+        x_cols = [col for col in model.hr_retention_data.columns if col != "Attrition"]
+        classifiers = [(name, type(clf).__name__, sorted((param, val) for param, val in clf.get_params().items()
+                                                         if param != "n_jobs"))
+                       for name, clf in model.classifiers.items()]
+        sha = hashlib.sha256()
+        sha.update(str(model.STATE_VERSION).encode())
+        sha.update(self.dataset_fingerprint().encode())
+        sha.update(repr(x_cols).encode())
+        sha.update(repr(classifiers).encode())
+        return sha.hexdigest()
+
+    def _path_for(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _remember(self, key, state):
+        self._models[key] = state
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_models:
+            evicted_key, _ = self._models.popitem(last=False)
+            logging.info(f"Evicted model {evicted_key} from memory")
+
+    def _load_state(self, key):
+        if key in self._models:
+            self._models.move_to_end(key)
+            logging.info(f"Found model {key} in memory")
+            return self._models[key]
+
+        path = self._path_for(key)
+        if os.path.isfile(path):
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+            except Exception:
+                logging.warning(f"Failed loading model from {path}, it will be retrained", exc_info=True)
+                return None
+            logging.info(f"Loaded model {key} from {path}")
+            self._remember(key, state)
+            return state
+        return None
+
+    def _save_state(self, key, state):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self._path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved model {key} to {path}")
+
+    def load(self, model):
+        """
+        Restore a trained model from the registry, returns False if it was never trained
+        """
+        key = self.key_for(model)
+        with span("registry_load"), self._lock:
+            state = self._load_state(key)
+        if state is None:
+            return False
+        model.set_trained_state(state)
+        return True
+
+    def store(self, model):
+        """
+        Store a trained model in the registry
+        """
+        key = self.key_for(model)
+        state = model.get_trained_state()
+        with span("registry_store"), self._lock:
+            self._remember(key, state)
+            self._save_state(key, state)
+
+    def train(self, model):
+        """
+        Train a model, unless the same model was already trained before
+        """
+        if self.load(model):
+            return
+        model.train()
+        self.store(model)
+
+    def update(self, model, new_data, **kwargs):
+        """
+        Update a model with new employees (see HREmployeeAttritionModel.update) and append them to the dataset (see
+        append_data), the updated model is stored under the key of the new dataset. Employees that are already in
+        the dataset are skipped, and nothing is appended if updating fails.
+        Returns True if the model was trained from scratch.
+        """
+        self.train(model)
+        new_data = drop_known_employees(self.data_path, new_data)
+        if new_data.empty:
+            logging.info("No new employees, the model is up to date")
+            return False
+        trained_from_scratch = model.update(new_data, **kwargs)
+        append_data(self.data_path, new_data)
+        self.store(model)
+        return trained_from_scratch
+
+    def clear(self):
+        """
+        Remove all models from memory
+        """
+        with self._lock:
+            self._models.clear()
@@ -0,0 +1,194 @@
+"""
+Schema of the features of the HR data: the type of every column, the range of its numbers or its allowed categories.
+The schema is derived once per version of the data and cached next to its binary copy, and it validates single
+employees (for the GUI and the HTTP service) or whole frames of employees at once (for the batch scorer).
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from model.dataset import DEFAULT_CACHE_DIR, get_fingerprint, load_data
+
+SCHEMA_VERSION = 1
+FIELD_TYPES = ["int", "float", "category", "bool"]
+ERROR_COLS = ["row", "field", "value", "error"]
+
+_schemas = {}
+_lock = threading.Lock()
+
+
+class FeatureSchema(object):
+    """
+    Types, ranges and categories of the columns of the HR data by their names.
+    Every field is a dict with its "type" (one of FIELD_TYPES), "min" and "max" for numbers and "options" for
+    categories.
+    """
+    def __init__(self, fields, fingerprint=None):
+        self.fields = fields
+        self.fingerprint = fingerprint
+        self._options = {col: frozenset(field["options"]) for col, field in fields.items() if "options" in field}
+
+    @classmethod
+    def from_data(cls, data, fingerprint=None):
+        """
+        Derive the schema of every column of a frame
+        """
+        fields = {}
+        for col in data.columns:
+            values = data[col]
+            if pd.api.types.is_bool_dtype(values):
+                fields[col] = {"type": "bool"}
+            elif pd.api.types.is_numeric_dtype(values):
+                is_int = pd.api.types.is_integer_dtype(values)
+                convert = int if is_int else float
+                fields[col] = {"type": "int" if is_int else "float",
+                               "min": convert(values.min()), "max": convert(values.max())}
+            else:
+                counts = values.value_counts(sort=False)
+                options = counts.index[counts > 0].astype(str)
+                fields[col] = {"type": "category", "options": sorted(options.tolist())}
+        return cls(fields, fingerprint)
+
+    def to_dict(self):
+        return {"version": SCHEMA_VERSION, "sha256": self.fingerprint, "fields": self.fields}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["fields"], state.get("sha256"))
+
+    def describe(self, col):
+        """
+        Describe the values a column may have, like "1 - 5" or "No, Yes"
+        """
+        field = self.fields[col]
+        if field["type"] == "category":
+            return ", ".join(field["options"])
+        if field["type"] == "bool":
+            return "false / true"
+        return f"{field['min']} - {field['max']}"
+
+    def _error_message(self, col):
+        field = self.fields[col]
+        if field["type"] == "category":
+            return f"must be one of: {self.describe(col)}"
+        if field["type"] == "bool":
+            return "must be true or false"
+        number = "a whole number" if field["type"] == "int" else "a number"
+        return f"must be {number} between {field['min']} and {field['max']}"
+
+    def check(self, col, val):
+        """
+        Check a single value of a column
+        """
+        field = self.fields[col]
+        if field["type"] == "category":
+            return str(val) in self._options[col]
+        if field["type"] == "bool":
+            return isinstance(val, (bool, np.bool_)) or str(val).lower() in ("true", "false", "0", "1")
+        try:
+            number = float(val)
+        except (TypeError, ValueError):
+            return False
+        if field["type"] == "int" and not number.is_integer():
+            return False
+        return field["min"] <= number <= field["max"]
+
+    def check_record(self, record, cols=None):
+        """
+        Check a single employee, cols are the columns it must have (all the fields by default).
+        Returns its missing, unknown and invalid columns.
+        """
+        cols = list(self.fields) if cols is None else cols
+        return {"missing": [col for col in cols if col not in record],
+                "unknown": [col for col in record if col not in cols],
+                "invalid": [col for col in cols if col in record and not self.check(col, record[col])]}
+
+    def _invalid_rows(self, col, values):
+        field = self.fields[col]
+        if field["type"] == "category":
+            return ~values.astype(str).isin(self._options[col]).to_numpy()
+        if field["type"] == "bool":
+            return ~values.astype(str).str.lower().isin(["true", "false", "0", "1"]).to_numpy()
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+        # NaN is out of every range
+        valid = (numbers >= field["min"]) & (numbers <= field["max"])
+        if field["type"] == "int":
+            valid &= np.mod(numbers, 1) == 0
+        return ~valid
+
+    def validate(self, data, cols=None):
+        """
+        Check a frame of employees (or a list of their records) at once, cols are the columns they must have
+        (all the fields by default).
+        Returns a frame of the errors with their row, field, value and error, empty when all the employees are valid.
+        """
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame.from_records(data)
+        cols = list(self.fields) if cols is None else cols
+        errors = []
+        for col in cols:
+            if col not in data.columns:
+                errors.append(pd.DataFrame({"row": data.index, "field": col, "value": None, "error": "missing"}))
+                continue
+            invalid = self._invalid_rows(col, data[col])
+            if invalid.any():
+                errors.append(pd.DataFrame({"row": data.index[invalid], "field": col,
+                                            "value": data[col].to_numpy()[invalid],
+                                            "error": self._error_message(col)}))
+        if not errors:
+            return pd.DataFrame(columns=ERROR_COLS)
+        return pd.concat(errors, ignore_index=True)
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def _schema_path(data_path, cache_dir):
+    name = os.path.splitext(os.path.basename(data_path))[0]
+    return os.path.join(cache_dir, f"{name}.schema.json")
+
+
+def get_schema(data_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Get the schema of a CSV file. It is derived from the data only when the file changes, and is cached in cache_dir
+    (None to not cache it on disk).
+    """
+    fingerprint = get_fingerprint(data_path)
+    with _lock:
+        schema = _schemas.get(data_path)
+        if schema is not None and schema.fingerprint == fingerprint:
+            return schema
+
+        path = _schema_path(data_path, cache_dir) if cache_dir else None
+        schema = None
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+                if state["version"] == SCHEMA_VERSION and state["sha256"] == fingerprint:
+                    schema = FeatureSchema.from_dict(state)
+            except Exception:
+                logging.warning(f"Failed loading the schema of {data_path}", exc_info=True)
+        if schema is None:
+            schema = FeatureSchema.from_data(load_data(data_path), fingerprint)
+            if path:
+                try:
+                    if not os.path.isdir(cache_dir):
+                        os.makedirs(cache_dir)
+                    schema.save(path)
+                except OSError:
+                    logging.warning(f"Failed saving the schema of {data_path}", exc_info=True)
+        _schemas[data_path] = schema
+        return schema
@@ -0,0 +1,138 @@
+"""
+Search of the classifiers of the ensemble and their sizes.
+Candidates are trained on growing samples of the train set (successive halving): after every round only the 1/eta
+most accurate candidates go on to the next round (the timings of the small rounds are too noisy to keep more).
+The candidates left are trained on the whole train set and evaluated on the test set, and the ones no other
+candidate beats on accuracy, fit time and latency together are the Pareto front to pick a configuration from.
+"""
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import CLASSIFIERS, create_classifier, weighted_vote
+from model.parallel import get_n_jobs
+
+DEFAULT_CANDIDATES = 24
+DEFAULT_ETA = 3
+DEFAULT_MIN_ROWS = 100
+# Sizes of the classifiers that have n_estimators, as shares of their size in CLASSIFIERS
+SIZE_SCALES = [0.05, 0.2, 1.0]
+LATENCY_REPEATS = 5
+OBJECTIVES = {"accuracy": max, "fit_time": min, "latency": min}
+
+
+def _scaled(classifier, scale):
+    module, class_name, params = classifier
+    if "n_estimators" in params:
+        params = dict(params, n_estimators=max(1, round(params["n_estimators"] * scale)))
+    return [module, class_name, params]
+
+
+def get_candidates(n_candidates=DEFAULT_CANDIDATES, classifiers=CLASSIFIERS, seed=0):
+    """
+    Get random ensembles of the classifiers with random sizes, in the format of CLASSIFIERS.
+    The full ensemble of all the classifiers is always the first candidate.
+    """
+    rng = random.Random(seed)
+    names = list(classifiers)
+    subsets = [members for size in range(1, len(names) + 1) for members in itertools.combinations(names, size)]
+    candidates = {}
+    full = {name: list(classifiers[name]) for name in names}
+    candidates[json.dumps(full, sort_keys=True)] = full
+    # Not every drawn candidate is new, so the space may run out before n_candidates
+    for _ in range(n_candidates * 20):
+        if len(candidates) >= n_candidates:
+            break
+        candidate = {name: _scaled(classifiers[name], rng.choice(SIZE_SCALES)) for name in rng.choice(subsets)}
+        candidates.setdefault(json.dumps(candidate, sort_keys=True), candidate)
+    return list(candidates.values())
+
+
+def run_trial(candidate, x_train, y_train, x_eval, y_eval):
+    """
+    Train an ensemble and evaluate it by hard voting, used as the target of the search workers.
+    Returns its accuracy, fit time and latency of predicting a single employee (in seconds).
+    """
+    classifiers = {name: create_classifier(*classifier) for name, classifier in candidate.items()}
+    start = time.perf_counter()
+    for model in classifiers.values():
+        model.fit(x_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    weights = np.ones(len(classifiers))
+    predictions, _ = weighted_vote([model.predict(x_eval) for model in classifiers.values()], weights)
+    latencies = []
+    for i in range(LATENCY_REPEATS):
+        row = x_eval[i % len(x_eval):i % len(x_eval) + 1]
+        start = time.perf_counter()
+        weighted_vote([model.predict(row) for model in classifiers.values()], weights)
+        latencies.append(time.perf_counter() - start)
+    return {"accuracy": float(np.mean(predictions == y_eval)), "fit_time": fit_time,
+            "latency": float(np.median(latencies))}
+
+
+def pareto_front(trials):
+    """
+    Get the trials that no other trial is at least as good as on all the OBJECTIVES and better on one of them
+    """
+    def at_least_as_good(a, b):
+        return all(a[name] >= b[name] if better == max else a[name] <= b[name] for name, better in OBJECTIVES.items())
+
+    return [trial for trial in trials
+            if not any(at_least_as_good(other, trial) and any(other[name] != trial[name] for name in OBJECTIVES)
+                       for other in trials if other is not trial)]
+
+
+def _run_trials(candidates, x_train, y_train, x_eval, y_eval, workers):
+    if workers <= 1:
+        results = [run_trial(candidate, x_train, y_train, x_eval, y_eval) for candidate in candidates]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(run_trial, candidate, x_train, y_train, x_eval, y_eval)
+                       for candidate in candidates]
+            results = [future.result() for future in futures]
+    return [dict(result, candidate=candidate) for candidate, result in zip(candidates, results)]
+
+
+def search(model, n_candidates=DEFAULT_CANDIDATES, eta=DEFAULT_ETA, min_rows=DEFAULT_MIN_ROWS, n_jobs=-1, seed=0):
+    """
+    Search ensembles over the data of a HREmployeeAttritionModel by successive halving.
+    Every round trains the candidates on eta times more rows of the train set than the one before, and is
+    evaluated on a validation share of the train set. The candidates left are trained on the whole train set
+    and evaluated on the test set.
+    Returns the rounds with their trials and the Pareto front of the last round.
+    """
+    from sklearn.model_selection import train_test_split
+
+    model.split_data()
+    x_train, y_train = model.x_train.to_numpy(dtype=float), model.y_train.to_numpy()
+    x_test, y_test = model.x_test.to_numpy(dtype=float), model.y_test.to_numpy()
+    x_search, x_val, y_search, y_val = train_test_split(x_train, y_train, test_size=0.25, random_state=seed,
+                                                        stratify=y_train)
+    workers = get_n_jobs(n_jobs)
+    candidates = get_candidates(n_candidates, seed=seed)
+    rounds = []
+    rows = min_rows
+    while len(candidates) > 1 and rows < len(x_search):
+        logging.info(f"Search round {len(rounds) + 1}: {len(candidates)} candidates over {rows} rows")
+        trials = _run_trials(candidates, x_search[:rows], y_search[:rows], x_val, y_val, workers)
+        rounds.append({"rows": rows, "trials": trials})
+        best = sorted(trials, key=lambda trial: (-trial["accuracy"], trial["fit_time"]))
+        candidates = [trial["candidate"] for trial in best[:math.ceil(len(trials) / eta)]]
+        rows *= eta
+
+    logging.info(f"Search final round: {len(candidates)} candidates over {len(x_train)} rows")
+    trials = _run_trials(candidates, x_train, y_train, x_test, y_test, workers)
+    rounds.append({"rows": len(x_train), "trials": trials})
+    front = sorted(pareto_front(trials), key=lambda trial: -trial["accuracy"])
+    return {"settings": {"candidates": n_candidates, "eta": eta, "min_rows": min_rows, "workers": workers,
+                         "seed": seed, "x_cols": model.x_cols},
+            "rounds": rounds, "pareto_front": front}
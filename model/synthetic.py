@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+# Numeric columns with more distinct values than this get noise, so the synthetic rows are not all copies
+NOISY_COL_MIN_VALUES = 50
+NOISE_SCALE = 0.05
+
+
+def synthesize_hr_data(data, n_rows, seed=0):
+    """
+    Create a synthetic dataset with the schema of data and about its distributions.
+    Rows are sampled from data (so the relations between the columns are kept), and numeric columns with many values
+    get noise of NOISE_SCALE of their standard deviation, kept in their original range.
+    """
+    rng = np.random.RandomState(seed)
+    synthetic = data.iloc[rng.randint(0, len(data), n_rows)].reset_index(drop=True)
+    for col in synthetic.columns:
+        values = data[col]
+        if not pd.api.types.is_numeric_dtype(values) or values.nunique() <= NOISY_COL_MIN_VALUES:
+            continue
+        noise = rng.normal(0, values.std() * NOISE_SCALE, n_rows)
+        noisy = np.clip(synthetic[col].to_numpy() + noise, values.min(), values.max())
+        synthetic[col] = noisy.round().astype(values.dtype) if pd.api.types.is_integer_dtype(values) else noisy
+    if "EmployeeNumber" in synthetic.columns:
+        synthetic["EmployeeNumber"] = np.arange(1, n_rows + 1)
+    return synthetic
@@ -0,0 +1,30 @@
+import argparse
+import logging
+
+from model import VOTING_TYPES
+from model.partial import QueryLog, precompute_models, DEFAULT_QUERY_LOG, DEFAULT_MAX_SUBSET_MODELS
+from model.registry import ModelRegistry, DEFAULT_REGISTRY_DIR
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the models the GUI predicts with ahead of time: the model of "
+                                                 "all the features and the models without the features users "
+                                                 "most often leave blank")
+    parser.add_argument("--max-models", type=int, default=DEFAULT_MAX_SUBSET_MODELS,
+                        help="Most models to train for sets of missing features")
+    parser.add_argument("--query-log", default=DEFAULT_QUERY_LOG, help="Log of the features missing in the queries")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of cores to use (-1 means all the cores)")
+    parser.add_argument("--voting", choices=VOTING_TYPES, default="hard",
+                        help="hard for a majority vote of the classifiers, soft for averaging their probabilities")
+    parser.add_argument("--registry-dir", default=DEFAULT_REGISTRY_DIR, help="Directory of the trained models")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    subsets = precompute_models(ModelRegistry(directory=args.registry_dir), QueryLog(args.query_log),
+                                args.max_models, n_jobs=args.n_jobs, voting=args.voting)
+    print(f"Trained the model of all the features and {len(subsets)} models without missing features:")
+    for missing_cols in subsets:
+        print(f"  without {', '.join(missing_cols)}")
@@ -0,0 +1,49 @@
+import argparse
+import logging
+
+import pandas as pd
+
+from model import HREmployeeAttritionModel, UNUSED_COLS, EVALUATION_POLICIES, DATA_PATH
+from model.dataset import clear_appended_data, get_appended_path
+from model.incremental import DEFAULT_FULL_TRAIN_EVERY, DEFAULT_MAX_ACCURACY_DROP
+from model.registry import ModelRegistry, DEFAULT_REGISTRY_DIR
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add new employees to the HR data and update the trained model")
+    parser.add_argument("input", nargs="?", help="CSV file of new employees, with the columns of the HR data")
+    parser.add_argument("--reset", action="store_true",
+                        help="Remove all the employees added by previous runs, back to the HR data the app ships with")
+    parser.add_argument("--full", action="store_true", help="Train the model from scratch")
+    parser.add_argument("--full-train-every", type=int, default=DEFAULT_FULL_TRAIN_EVERY,
+                        help="Train the model from scratch on every this number of updates")
+    parser.add_argument("--max-accuracy-drop", type=float, default=DEFAULT_MAX_ACCURACY_DROP,
+                        help="Train the model from scratch if the accuracy over the new employees is lower than "
+                             "the test accuracy by more than this")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of cores to use (-1 means all the cores)")
+    parser.add_argument("--registry-dir", default=DEFAULT_REGISTRY_DIR, help="Directory of the trained models")
+    parser.add_argument("--evaluation", choices=EVALUATION_POLICIES, default="full",
+                        help="How to evaluate the classifiers after training them")
+    args = parser.parse_args()
+    if not args.input and not args.reset:
+        parser.error("Give a CSV file of new employees, or --reset")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    if args.reset:
+        if clear_appended_data(DATA_PATH):
+            logging.info(f"Removed the employees added to the HR data ({get_appended_path(DATA_PATH)})")
+        else:
+            logging.info("No employees were added to the HR data")
+    if args.input:
+        model = HREmployeeAttritionModel(n_jobs=args.n_jobs, evaluation=args.evaluation)
+        for col in UNUSED_COLS:
+            del model.hr_retention_data[col]
+        full_train_every = 1 if args.full else args.full_train_every
+        trained_from_scratch = ModelRegistry(directory=args.registry_dir).update(
+            model, pd.read_csv(args.input), full_train_every=full_train_every,
+            max_accuracy_drop=args.max_accuracy_drop)
+        logging.info(f"The model was {'trained from scratch' if trained_from_scratch else 'updated'}")
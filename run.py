@@ -1,9 +1,7 @@
 import logging
+import random
 from pathlib import Path
 
-from view.hr_app import open_gui
-import numpy as np
-
 MIN_RAND = 1000
 MAX_RAND = 1000000
 
@@ -13,7 +11,7 @@ def set_logger():
 
     if not logs_folder.is_dir():
         logs_folder.mkdir()
-    log_file = str(logs_folder / f"example_{np.random.randint(MIN_RAND, MAX_RAND)}.log")
+    log_file = str(logs_folder / f"example_{random.randrange(MIN_RAND, MAX_RAND)}.log")
     logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s",
                         handlers=[logging.FileHandler(log_file),
                                   logging.StreamHandler()],
@@ -23,5 +21,7 @@ def set_logger():
 if __name__ == '__main__':
     set_logger()
     logging.info("********************************** OPENING APP **********************************")
+    from view.hr_app import open_gui
+
     open_gui()
     logging.info("********************************** CLOSING APP **********************************")
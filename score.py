@@ -0,0 +1,215 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from model import HREmployeeAttritionModel, UNUSED_COLS, VOTING_TYPES, EVALUATION_POLICIES, DATA_PATH
+from model.compiled import CompiledModel
+from model.dataset import get_fingerprint, load_data
+from model.drift import DEFAULT_DRIFT_STATE, load_monitor, log_report
+from model.ensemble import load_ensemble
+from model.registry import ModelRegistry, DEFAULT_REGISTRY_DIR
+from model.schema import get_schema
+
+DEFAULT_CHUNK_SIZE = 50000
+PREDICTION_COL = "AttritionPrediction"
+CONFIDENCE_COL = "Confidence"
+ID_COL = "EmployeeNumber"
+# Prefix of the columns of the attributions of the features to the probability of attrition
+ATTRIBUTION_PREFIX = "Attribution_"
+# score scores invalid employees anyway, skip leaves them out of the output and error stops scoring
+INVALID_POLICIES = ["score", "skip", "error"]
+MAX_LOGGED_ERRORS = 5
+
+
+def read_chunks(path, chunk_size):
+    """
+    Read a CSV or Parquet file of employees in chunks
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield chunk
+
+
+class ChunksWriter(object):
+    """
+    Write chunks of results to a CSV or Parquet file
+    """
+    def __init__(self, path):
+        self.path = path
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, chunk):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode="a" if self._wrote_header else "w", header=not self._wrote_header,
+                         index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def get_trained_model(n_jobs=1, registry_dir=DEFAULT_REGISTRY_DIR, voting="hard", evaluation="test", ensemble=None):
+    """
+    Get a model trained over all the features, ensemble is the path of a config of its classifiers (see
+    model.ensemble), CLASSIFIERS by default
+    """
+    kwargs = {"voting": voting}
+    if ensemble:
+        kwargs.update(load_ensemble(ensemble))
+    model = HREmployeeAttritionModel(n_jobs=n_jobs, evaluation=evaluation, **kwargs)
+    for col in UNUSED_COLS:
+        del model.hr_retention_data[col]
+    ModelRegistry(directory=registry_dir).train(model)
+    # A cascade stored for other latency budgets is calibrated now, not on the first employee
+    model.get_cascade()
+    return model
+
+
+def score_chunk(model, chunk, explain=False, monitor=None):
+    """
+    Score a chunk of employees, returns their predictions and the votes of every classifier.
+    model is a trained HREmployeeAttritionModel or a CompiledModel.
+    With explain the attributions of every feature by the tree classifiers are added too (see model.attribution),
+    it needs a trained HREmployeeAttritionModel. The employees are added to the drift monitor, when it is given.
+    """
+    missing = chunk[list(model.x_cols)].isna().to_numpy()
+    chunk = chunk.fillna(0)
+    x = model.fit_frame(chunk)
+    if monitor is not None:
+        # The monitor counts the missing values, which are filled with 0 only for scoring
+        monitor.update(np.where(missing, np.nan, x))
+    predictions, confidence, votes = model.predict_with_votes(x)
+    result = pd.DataFrame(index=chunk.index)
+    if ID_COL in chunk.columns:
+        result[ID_COL] = chunk[ID_COL]
+    result[PREDICTION_COL] = model.decode("Attrition", predictions)
+    result[CONFIDENCE_COL] = confidence
+    for model_name, prediction in votes.items():
+        result[model_name] = model.decode("Attrition", prediction)
+    if explain:
+        attributions = model.explain(x)["ensemble"]
+        for col in attributions.columns:
+            result[f"{ATTRIBUTION_PREFIX}{col}"] = attributions[col].to_numpy()
+    return result
+
+
+def validate_chunk(schema, cols, chunk, invalid="score"):
+    """
+    Validate a chunk of employees by the schema of the HR data, returns the employees to score
+    """
+    errors = schema.validate(chunk, cols)
+    if errors.empty:
+        return chunk
+    missing = sorted(errors[errors["error"] == "missing"]["field"].unique())
+    if missing:
+        # The employees cannot be scored without the columns the model was trained on, whatever the policy
+        raise ValueError(f"Missing columns: {missing}")
+    message = f"{errors['row'].nunique()} of {len(chunk)} employees are invalid: " + \
+              "; ".join(f"row {error.row} {error.field}={error.value!r} {error.error}"
+                        for error in errors.head(MAX_LOGGED_ERRORS).itertuples())
+    if invalid == "error":
+        raise ValueError(message)
+    logging.warning(message)
+    if invalid == "skip":
+        return chunk.drop(index=errors["row"].unique())
+    return chunk
+
+
+def score_file(model, input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, schema=None, invalid="score",
+               explain=False, monitor=None):
+    """
+    Score a whole file of employees chunk by chunk, returns the number of scored employees.
+    Every chunk is validated by schema first, when it is given, and invalid is what to do with invalid employees
+    (one of INVALID_POLICIES). With explain the attributions of the features are written too, and the scored
+    employees are added to the drift monitor (see model.drift), when it is given.
+    """
+    writer = ChunksWriter(output_path)
+    rows = 0
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(input_path, chunk_size):
+            chunk_start = time.perf_counter()
+            if schema is not None:
+                chunk = validate_chunk(schema, model.x_cols, chunk, invalid)
+                if chunk.empty:
+                    logging.warning("Skipped a chunk with no valid employees")
+                    continue
+            writer.write(score_chunk(model, chunk, explain, monitor))
+            rows += len(chunk)
+            chunk_time = time.perf_counter() - chunk_start
+            logging.info(f"Scored {len(chunk)} employees in {chunk_time:.3f}s "
+                         f"({len(chunk) / max(chunk_time, 1e-9):.0f} rows/s), {rows} in total")
+    finally:
+        writer.close()
+    total_time = time.perf_counter() - start
+    logging.info(f"Scored {rows} employees from {input_path} to {output_path} in {total_time:.3f}s "
+                 f"({rows / max(total_time, 1e-9):.0f} rows/s)")
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score a file of employees without the GUI")
+    parser.add_argument("input", help="CSV or Parquet file of employees, with the columns of the HR data")
+    parser.add_argument("output", help="CSV or Parquet file to write the predictions and votes to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Number of employees to score at once")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of cores to use (-1 means all the cores)")
+    parser.add_argument("--voting", choices=VOTING_TYPES, default="hard",
+                        help="hard for a majority vote of the classifiers, soft for averaging their probabilities")
+    parser.add_argument("--registry-dir", default=DEFAULT_REGISTRY_DIR, help="Directory of the trained models")
+    parser.add_argument("--evaluation", choices=EVALUATION_POLICIES, default="test",
+                        help="How to evaluate the classifiers if they are trained")
+    parser.add_argument("--ensemble", help="JSON config of the ensemble (see ensemble.json), its voting is used "
+                                           "over --voting")
+    parser.add_argument("--compiled", help="Score with a model compiled by export.py instead of the trained model")
+    parser.add_argument("--invalid", choices=INVALID_POLICIES, default="score",
+                        help="What to do with employees whose values are not like the HR data: score them anyway, "
+                             "skip them or stop")
+    parser.add_argument("--explain", action="store_true",
+                        help="Add the attributions of every feature to the probability of attrition, by the tree "
+                             "classifiers (not with --compiled)")
+    parser.add_argument("--drift-state", default=DEFAULT_DRIFT_STATE,
+                        help="File of the drift monitor the scored employees are added to")
+    parser.add_argument("--no-drift", action="store_true", help="Do not monitor the drift of the scored employees")
+    args = parser.parse_args()
+    if args.explain and args.compiled:
+        parser.error("--explain needs the trained model, it can not be used with --compiled")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        raise ValueError("The output file must be different from the input file")
+    if args.compiled:
+        scoring_model = CompiledModel.load(args.compiled)
+    else:
+        scoring_model = get_trained_model(args.n_jobs, args.registry_dir, args.voting, args.evaluation,
+                                          args.ensemble)
+    drift_monitor = None if args.no_drift else \
+        load_monitor(args.drift_state, scoring_model, load_data(DATA_PATH), get_fingerprint(DATA_PATH))
+    score_file(scoring_model, args.input, args.output, args.chunk_size, get_schema(DATA_PATH), args.invalid,
+               args.explain, drift_monitor)
+    if drift_monitor is not None:
+        drift_monitor.save(args.drift_state)
+        log_report(drift_monitor.report())
@@ -0,0 +1,37 @@
+import argparse
+import json
+import logging
+
+from model import HREmployeeAttritionModel, UNUSED_COLS
+from model.search import search, DEFAULT_CANDIDATES, DEFAULT_ETA, DEFAULT_MIN_ROWS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Search ensembles of classifiers that are as accurate and cheaper")
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES, help="Number of ensembles to try")
+    parser.add_argument("--eta", type=int, default=DEFAULT_ETA,
+                        help="Every round keeps 1/eta of the candidates and trains them on eta times more rows")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS, help="Rows of the first round")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="Number of candidates to train at once (-1 means all the cores)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the candidates and the validation set")
+    parser.add_argument("--output", default="search.json", help="JSON file to save the trials and Pareto front to")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    model = HREmployeeAttritionModel()
+    for col in UNUSED_COLS:
+        del model.hr_retention_data[col]
+    result = search(model, args.candidates, args.eta, args.min_rows, args.n_jobs, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{'accuracy':>10} {'fit time':>10} {'latency':>10}  classifiers")
+    for trial in result["pareto_front"]:
+        members = ", ".join(f"{name}({params.get('n_estimators', '')})" if "n_estimators" in params else name
+                            for name, (_, _, params) in trial["candidate"].items())
+        print(f"{trial['accuracy']:10.3f} {trial['fit_time']:9.3f}s {trial['latency'] * 1000:8.2f}ms  {members}")
+    print(f"Saved the trials to {args.output}")
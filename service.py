@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model import DATA_PATH, VOTING_TYPES
+from model.compiled import CompiledModel
+from model.dataset import get_fingerprint, load_data
+from model.drift import DEFAULT_DRIFT_STATE, load_monitor, log_report
+from model.instrumentation import span
+from model.registry import DEFAULT_REGISTRY_DIR
+from model.schema import get_schema
+from score import get_trained_model
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_BATCH_WINDOW = 0.002
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_REQUEST_TIMEOUT = 10.0
+MAX_BODY_SIZE = 64 * 1024
+MAX_HEADERS = 100
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class RequestError(Exception):
+    """
+    Raised for a request that can not be served, with the HTTP status to answer it with and the error to send
+    """
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.headers = headers or {}
+
+
+class MicroBatcher(object):
+    """
+    Coalesces the employees of concurrent requests into batches, and predicts every batch with a single call.
+    A batch is predicted batch_window seconds after its first employee arrived, or as soon as the previous batch
+    is done. At most max_queue employees may wait, more are rejected so the callers back off.
+    Every predicted batch is added to the drift monitor, when it is given.
+    """
+    def __init__(self, model, batch_window=DEFAULT_BATCH_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_queue=DEFAULT_MAX_QUEUE, monitor=None):
+        self.model = model
+        self.monitor = monitor
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batches = 0
+        self.scored = 0
+        self.rejected = 0
+        # Predictions run one batch at a time out of the event loop, so requests are still accepted meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, row):
+        """
+        Predict for a single encoded employee, returns the prediction and its confidence
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise RequestError(503, "Too many requests are waiting, try again later", {"Retry-After": "1"})
+        return await future
+
+    def _predict_batch(self, rows):
+        with span("predict_batch"):
+            predictions, confidence = self.model.predict_with_confidence(rows)
+        if self.monitor is not None:
+            self.monitor.update(rows)
+        return self.model.decode("Attrition", predictions), confidence
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while len(items) < self.max_batch_size and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            # Requests that timed out while waiting are not predicted
+            items = [(row, future) for row, future in items if not future.done()]
+            if not items:
+                continue
+
+            try:
+                predictions, confidence = await loop.run_in_executor(
+                    self._executor, self._predict_batch, np.asarray([row for row, _ in items]))
+            except Exception as e:
+                logging.exception(f"Failed predicting a batch of {len(items)} employees")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.scored += len(items)
+            for (_, future), prediction, val in zip(items, predictions, confidence):
+                if not future.done():
+                    future.set_result((prediction, float(val)))
+
+
+class ScoringService(object):
+    """
+    HTTP service on localhost that predicts for one employee per request:
+    POST /predict with a JSON object of the employee's features, GET /health for the state of the service and
+    GET /drift for the drift of the predicted employees from the HR data (with a monitor, which is saved to
+    drift_state when the service stops)
+    """
+    def __init__(self, model, schema, request_timeout=DEFAULT_REQUEST_TIMEOUT, monitor=None, drift_state=None,
+                 **batcher_kwargs):
+        self.model = model
+        self.schema = schema
+        self.request_timeout = request_timeout
+        self.monitor = monitor
+        self.drift_state = drift_state
+        self.batcher = MicroBatcher(model, monitor=monitor, **batcher_kwargs)
+        self.started = time.time()
+        self._server = None
+
+    async def start(self, port=DEFAULT_PORT):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, HOST, port)
+        logging.info(f"Serving on http://{HOST}:{self._server.sockets[0].getsockname()[1]}")
+        return self._server
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+        if self.monitor is not None and self.drift_state:
+            self.monitor.save(self.drift_state)
+            log_report(self.monitor.report())
+
+    def validate(self, payload):
+        """
+        Validate the features of an employee, returns them in the order of the model's features
+        """
+        if not isinstance(payload, dict):
+            raise RequestError(400, "The body must be a JSON object of the employee's features")
+        errors = self.schema.check_record(payload, self.model.x_cols)
+        if any(errors.values()):
+            raise RequestError(400, errors)
+        return {col: payload[col] for col in self.model.x_cols}
+
+    def health(self):
+        return {"status": "ok", "model": type(self.model).__name__, "uptime": time.time() - self.started,
+                "queued": self.batcher.queue.qsize(), "max_queue": self.batcher.queue.maxsize,
+                "batches": self.batcher.batches, "scored": self.batcher.scored, "rejected": self.batcher.rejected}
+
+    async def predict(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "The body is not valid JSON")
+        row = self.model.fit_data(self.validate(payload))
+        try:
+            prediction, confidence = await asyncio.wait_for(self.batcher.predict(row), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise RequestError(504, "Predicting took too long")
+        return {"prediction": prediction, "confidence": confidence}
+
+    async def route(self, method, path, body):
+        """
+        Serve a request, returns the status and the JSON body of the response
+        """
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(405, "Use GET")
+            return 200, self.health()
+        if path == "/drift":
+            if method != "GET":
+                raise RequestError(405, "Use GET")
+            if self.monitor is None:
+                raise RequestError(404, "The drift is not monitored")
+            return 200, self.monitor.report()
+        if path == "/predict":
+            if method != "POST":
+                raise RequestError(405, "Use POST")
+            return 200, await self.predict(body)
+        raise RequestError(404, f"Unknown path: {path}")
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive, headers=None):
+        body = json.dumps(payload).encode()
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Content-Type: application/json",
+                 f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {val}" for name, val in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _read_request(self, reader):
+        """
+        Read a request, returns its method, path, version, headers and body, or None when the connection is closed
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise RequestError(400, "Bad request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise RequestError(400, "Too many headers")
+            name, _, val = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = val.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(400, "Bad Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, f"The body must be at most {MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, path.split("?")[0], version, headers, body
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as e:
+                    # The rest of the request can not be trusted, so the connection is closed
+                    self._write_response(writer, e.status, {"error": e.message}, False, e.headers)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                method, path, version, headers, body = request
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = await self.route(method, path, body)
+                    response_headers = None
+                except RequestError as e:
+                    status, payload, response_headers = e.status, {"error": e.message}, e.headers
+                self._write_response(writer, status, payload, keep_alive, response_headers)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"Serve predictions over HTTP on {HOST}")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--compiled", help="Serve a model compiled by export.py instead of the trained model")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of cores to use (-1 means all the cores)")
+    parser.add_argument("--voting", choices=VOTING_TYPES, default="hard",
+                        help="hard for a majority vote of the classifiers, soft for averaging their probabilities")
+    parser.add_argument("--ensemble", help="JSON config of the ensemble (see ensemble.json), its voting is used "
+                                           "over --voting")
+    parser.add_argument("--registry-dir", default=DEFAULT_REGISTRY_DIR, help="Directory of the trained models")
+    parser.add_argument("--batch-window", type=float, default=DEFAULT_BATCH_WINDOW,
+                        help="Seconds to wait for more employees before predicting a batch")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Most employees to predict at once")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="Most employees that may wait, more are answered with 503")
+    parser.add_argument("--drift-state", default=DEFAULT_DRIFT_STATE,
+                        help="File of the drift monitor the predicted employees are added to")
+    parser.add_argument("--no-drift", action="store_true", help="Do not monitor the drift of the predicted employees")
+    return parser.parse_args()
+
+
+async def serve(args):
+    if args.compiled:
+        model = CompiledModel.load(args.compiled)
+    else:
+        model = get_trained_model(args.n_jobs, args.registry_dir, args.voting, ensemble=args.ensemble)
+    monitor = None if args.no_drift else \
+        load_monitor(args.drift_state, model, load_data(DATA_PATH), get_fingerprint(DATA_PATH))
+    service = ScoringService(model, get_schema(DATA_PATH), monitor=monitor, drift_state=args.drift_state,
+                             batch_window=args.batch_window, max_batch_size=args.max_batch_size,
+                             max_queue=args.max_queue)
+    server = await service.start(args.port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format="[%(levelname)s] [%(asctime)s] [%(name)s]: %(message)s", level=logging.INFO)
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
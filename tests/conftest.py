@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from model import HREmployeeAttritionModel, UNUSED_COLS
+
+# Small versions of the classifiers of the ensemble, so the model trains in seconds
+SMALL_CLASSIFIERS = {
+    "RandomForestClassifier_Gini": ("sklearn.ensemble", "RandomForestClassifier",
+                                    {"n_estimators": 20, "criterion": "gini", "random_state": 0}),
+    "KNeighborsClassifier": ("model.neighbors", "ScaledKNeighborsClassifier", {}),
+    "BaggingClassifier": ("sklearn.ensemble", "BaggingClassifier", {"n_estimators": 10, "random_state": 0}),
+    "XGBClassifier": ("xgboost", "XGBClassifier", {"n_estimators": 20, "max_depth": 3})
+}
+
+
+def create_model(**kwargs):
+    """
+    Create a model of the small classifiers over the HR data without its unused columns, like the tools do
+    """
+    kwargs.setdefault("classifier_specs", SMALL_CLASSIFIERS)
+    model = HREmployeeAttritionModel(**kwargs)
+    for col in UNUSED_COLS:
+        del model.hr_retention_data[col]
+    return model
+
+
+@pytest.fixture(scope="session", autouse=True)
+def working_dir(tmp_path_factory):
+    """
+    Run in a temporary directory, the data cache is written under the working directory
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("work"))
+    yield
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def trained_model():
+    """
+    A trained model shared by the tests, which must not change it
+    """
+    model = create_model()
+    model.train()
+    return model
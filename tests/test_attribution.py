@@ -0,0 +1,43 @@
+import numpy as np
+
+from model.attribution import BIAS_COL, top_features
+
+
+def _positive_probas(model, x):
+    positive_code = model.encoder.encode("Attrition", ["Yes"])[0]
+    return {model_name: proba[:, list(model.classifiers[model_name].classes_).index(positive_code)]
+            for model_name, proba in model.predict_probas(x).items()}
+
+
+def test_attributions_add_up_to_the_probability(trained_model):
+    x = trained_model.x_test.copy()
+    frames = trained_model.explain(x)
+    probas = _positive_probas(trained_model, x)
+    assert set(frames) == {"RandomForestClassifier_Gini", "BaggingClassifier", "XGBClassifier", "ensemble"}
+    for model_name, frame in frames.items():
+        if model_name == "ensemble":
+            continue
+        np.testing.assert_allclose(frame.sum(axis=1), probas[model_name], atol=1e-6, err_msg=model_name)
+
+
+def test_ensemble_attributions_average_the_classifiers(trained_model):
+    x = trained_model.x_test.copy()
+    frames = trained_model.explain(x)
+    probas = _positive_probas(trained_model, x)
+    tree_names = [model_name for model_name in frames if model_name != "ensemble"]
+    np.testing.assert_allclose(frames["ensemble"].sum(axis=1),
+                               np.mean([probas[model_name] for model_name in tree_names], axis=0), atol=1e-6)
+
+
+def test_attributions_are_cached(trained_model):
+    x = trained_model.x_test.iloc[:10]
+    assert trained_model.explain(x) is trained_model.explain(x.copy())
+
+
+def test_top_features_push_toward_attrition(trained_model):
+    attributions = trained_model.explain(trained_model.x_test.iloc[:1])["ensemble"].iloc[0]
+    top = top_features(attributions, 3)
+    assert len(top) <= 3
+    assert BIAS_COL not in [col for col, _ in top]
+    assert all(val > 0 for _, val in top)
+    assert [val for _, val in top] == sorted((val for _, val in top), reverse=True)
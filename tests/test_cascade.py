@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from model.cascade import choose_threshold, split_stages
+from model.encoder import UNKNOWN_CODE
+from tests.conftest import create_model
+
+CONFIDENCE = np.array([0.9, 0.8, 0.6, 0.55])
+FIRST_PREDICTIONS = np.array([1, 1, 0, 1])
+FULL_PREDICTIONS = np.array([1, 1, 1, 0])
+
+
+@pytest.mark.parametrize("max_accuracy_drop, threshold", [(0.0, 0.8), (0.25, 0.6), (0.5, 0.55), (1.0, 0.55)])
+def test_threshold_is_the_lowest_within_the_accuracy_drop(max_accuracy_drop, threshold):
+    assert choose_threshold(CONFIDENCE, FIRST_PREDICTIONS, FULL_PREDICTIONS, max_accuracy_drop) == threshold
+
+
+def test_no_threshold_when_every_prediction_differs():
+    assert np.isinf(choose_threshold(CONFIDENCE, FIRST_PREDICTIONS, 1 - FIRST_PREDICTIONS, 0.0))
+
+
+def test_classifiers_over_their_budgets_are_deferred():
+    latencies = {"fast": 0.001, "slow": 0.05, "unbudgeted": 0.1}
+    assert split_stages(latencies, {"fast": 10, "slow": 10}) == (["fast", "unbudgeted"], ["slow"])
+    assert split_stages(latencies, {"slow": 100}) == (["fast", "slow", "unbudgeted"], [])
+
+
+def _cascade_model(trained_model, max_accuracy_drop):
+    # A budget no classifier can meet always defers Bagging
+    model = create_model(latency_budgets={"BaggingClassifier": 0}, cascade_accuracy_drop=max_accuracy_drop)
+    model.set_trained_state(trained_model.get_trained_state())
+    return model
+
+
+@pytest.mark.parametrize("max_accuracy_drop", [0.0, 0.05])
+def test_cascade_differs_from_the_ensemble_within_the_accuracy_drop(trained_model, max_accuracy_drop):
+    model = _cascade_model(trained_model, max_accuracy_drop)
+    cascade = model.get_cascade()
+    assert cascade["settings"]["accuracy_drop"] == max_accuracy_drop
+    x = model.x_test.copy()
+    predictions, _, votes = model.predict_with_votes(x)
+    assert np.mean(predictions != trained_model.predict(x)) <= max_accuracy_drop
+    assert cascade["deferred"] == ["BaggingClassifier"]
+    assert (votes["BaggingClassifier"] == UNKNOWN_CODE).any()
+
+
+def test_cascade_is_calibrated_again_for_other_settings(trained_model):
+    model = _cascade_model(trained_model, 0.0)
+    cascade = model.get_cascade()
+    assert model.get_cascade() is cascade
+    model.cascade_accuracy_drop = 0.05
+    assert model.get_cascade()["settings"]["accuracy_drop"] == 0.05
+    assert trained_model.get_cascade() is None
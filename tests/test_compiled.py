@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from model.compiled import CompiledModel
+
+
+@pytest.fixture(scope="module")
+def compiled(trained_model):
+    return CompiledModel.from_model(trained_model)
+
+
+def test_probabilities_match_the_model(trained_model, compiled):
+    # A copy of the test set, so the scores cached by the evaluation are not reused
+    x = trained_model.x_test.copy()
+    expected = trained_model.predict_probas(x)
+    probas = compiled.predict_probas(x.to_numpy(dtype=float))
+    assert list(probas) == list(expected)
+    for model_name, proba in probas.items():
+        np.testing.assert_allclose(proba, expected[model_name], atol=1e-5, err_msg=model_name)
+
+
+def test_predictions_match_the_model(trained_model, compiled):
+    x = trained_model.x_test.copy()
+    predictions, confidence, votes = compiled.predict_with_votes(x.to_numpy(dtype=float))
+    expected_predictions, expected_confidence, expected_votes = trained_model.predict_with_votes(x)
+    np.testing.assert_array_equal(predictions, expected_predictions)
+    np.testing.assert_allclose(confidence, expected_confidence)
+    for model_name, vote in votes.items():
+        np.testing.assert_array_equal(vote, expected_votes[model_name])
+
+
+def test_saved_model_predicts_the_same(trained_model, compiled, tmp_path):
+    path = str(tmp_path / "model.npz")
+    compiled.save(path)
+    loaded = CompiledModel.load(path)
+    x = trained_model.x_test.to_numpy(dtype=float)
+    for model_name, proba in loaded.predict_probas(x).items():
+        np.testing.assert_array_equal(proba, compiled.predict_probas(x)[model_name])
+
+
+def test_records_are_encoded_like_the_model(trained_model, compiled):
+    record = trained_model.hr_retention_data.iloc[0].to_dict()
+    np.testing.assert_allclose(compiled.fit_data(record), trained_model.fit_data(
+        {col: record[col] for col in trained_model.x_cols}))
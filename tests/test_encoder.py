@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.encoder import CategoricalEncoder, UNKNOWN_CODE
+
+DATA = pd.DataFrame({"Department": ["Sales", "Research", "Sales", "HR", "Sales"], "Age": [30, 40, 50, 35, 45]})
+
+
+def _fit(unknown):
+    return CategoricalEncoder(cols=["Department"], unknown=unknown).fit(DATA)
+
+
+def test_categories_are_sorted():
+    encoder = _fit("ignore")
+    assert encoder.categories == {"Department": ["HR", "Research", "Sales"]}
+    assert encoder.most_frequent == {"Department": "Sales"}
+    np.testing.assert_array_equal(encoder.encode("Department", DATA["Department"]), [2, 1, 2, 0, 2])
+    assert "Age" not in encoder
+
+
+def test_ignore_encodes_unknown_values_as_unknown_code():
+    codes = _fit("ignore").encode("Department", ["HR", "Marketing"])
+    np.testing.assert_array_equal(codes, [0, UNKNOWN_CODE])
+
+
+def test_most_frequent_encodes_unknown_values_as_the_most_frequent_category():
+    codes = _fit("most_frequent").encode("Department", ["HR", "Marketing"])
+    np.testing.assert_array_equal(codes, [0, 2])
+
+
+def test_error_raises_on_unknown_values():
+    encoder = _fit("error")
+    np.testing.assert_array_equal(encoder.encode("Department", ["HR"]), [0])
+    with pytest.raises(ValueError, match="Marketing"):
+        encoder.encode("Department", ["HR", "Marketing"])
+
+
+def test_unknown_policy_must_be_known():
+    with pytest.raises(ValueError):
+        CategoricalEncoder(unknown="drop")
+
+
+def test_categorical_columns_are_encoded_like_text():
+    encoder = _fit("ignore")
+    values = pd.Series(["Sales", "Marketing", "HR"])
+    np.testing.assert_array_equal(encoder.encode("Department", values.astype("category")),
+                                  encoder.encode("Department", values))
+
+
+def test_decode_reverses_encode():
+    encoder = _fit("ignore")
+    codes = encoder.encode("Department", ["Research", "Marketing"])
+    assert list(encoder.decode("Department", codes)) == ["Research", None]
+
+
+def test_transform_keeps_the_other_columns():
+    transformed = _fit("ignore").transform(DATA)
+    assert list(transformed["Department"]) == [2, 1, 2, 0, 2]
+    assert list(transformed["Age"]) == list(DATA["Age"])
+    assert list(DATA["Department"]) == ["Sales", "Research", "Sales", "HR", "Sales"]
+
+
+def test_saved_encoder_encodes_the_same(tmp_path):
+    encoder = _fit("most_frequent")
+    path = str(tmp_path / "encoder.json")
+    encoder.save(path)
+    loaded = CategoricalEncoder.load(path)
+    assert loaded.unknown == "most_frequent"
+    np.testing.assert_array_equal(loaded.encode("Department", ["Marketing", "HR"]),
+                                  encoder.encode("Department", ["Marketing", "HR"]))
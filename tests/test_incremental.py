@@ -0,0 +1,62 @@
+import pytest
+from sklearn.ensemble import BaggingClassifier, RandomForestClassifier
+from xgboost import XGBClassifier
+
+from model.incremental import get_new_estimators, warm_start_classifier
+from tests.conftest import create_model
+
+NEW_ROWS = 100
+
+
+@pytest.fixture(scope="module")
+def data(trained_model):
+    return trained_model.x_train, trained_model.y_train
+
+
+def test_new_estimators_follow_the_share_of_new_rows():
+    assert get_new_estimators(500, 100, 1000) == 50
+    assert get_new_estimators(10, 1, 1000) == 1
+
+
+@pytest.mark.parametrize("classifier", [RandomForestClassifier(n_estimators=20, random_state=0),
+                                        BaggingClassifier(n_estimators=10, random_state=0)])
+def test_warm_start_adds_estimators(data, classifier):
+    x, y = data
+    classifier.fit(x[:-NEW_ROWS], y[:-NEW_ROWS])
+    n_estimators = classifier.n_estimators
+    warm_start_classifier("classifier", classifier, x, y, NEW_ROWS)
+    assert len(classifier.estimators_) == n_estimators + get_new_estimators(n_estimators, NEW_ROWS, len(x))
+    assert classifier.get_params()["n_estimators"] == n_estimators
+    assert not classifier.get_params()["warm_start"]
+
+
+def test_warm_start_continues_boosting(data):
+    x, y = data
+    classifier = XGBClassifier(n_estimators=20, max_depth=3).fit(x[:-NEW_ROWS], y[:-NEW_ROWS])
+    warm_start_classifier("classifier", classifier, x, y, NEW_ROWS)
+    assert classifier.get_booster().num_boosted_rounds() == 20 + get_new_estimators(20, NEW_ROWS, len(x))
+    assert classifier.get_params()["n_estimators"] == 20
+
+
+def _new_employees(model, n_rows):
+    return model.hr_retention_data.iloc[:n_rows].copy()
+
+
+def test_update_grows_a_copy_of_the_trees(trained_model):
+    model = create_model()
+    model.set_trained_state(trained_model.get_trained_state())
+    assert not model.update(_new_employees(model, 50), max_accuracy_drop=1.0)
+    assert model.incremental_updates == 1
+    # 40 of the new employees are added to the train set
+    assert len(model.classifiers["RandomForestClassifier_Gini"].estimators_) == \
+        20 + get_new_estimators(20, 40, len(model.x_train))
+    assert len(trained_model.classifiers["RandomForestClassifier_Gini"].estimators_) == 20
+    assert len(model.x_test) == len(trained_model.x_test) + 10
+
+
+def test_update_trains_from_scratch_every_full_train_every(trained_model):
+    model = create_model()
+    model.set_trained_state(trained_model.get_trained_state())
+    assert model.update(_new_employees(model, 50), full_train_every=1)
+    assert model.incremental_updates == 0
+    assert len(model.classifiers["RandomForestClassifier_Gini"].estimators_) == 20
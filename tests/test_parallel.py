@@ -0,0 +1,11 @@
+from tests.conftest import create_model
+
+
+def test_predicting_in_threads_is_timed_like_training(trained_model):
+    model = create_model(n_jobs=2)
+    model.set_trained_state(trained_model.get_trained_state())
+    model.predict_probas(model.x_test.copy())
+    for model_name in model.classifiers:
+        timing = model.timings[f"predict_proba_{model_name}"]
+        assert set(timing) == set(trained_model.timings[f"fit_{model_name}"])
+        assert timing["cpu"] >= 0 and timing["utilisation"] >= 0
@@ -0,0 +1,68 @@
+import pytest
+
+from model.registry import ModelRegistry
+from tests.conftest import SMALL_CLASSIFIERS, create_model
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(directory=str(tmp_path / "registry"), max_models=1)
+
+
+def _fail_training():
+    raise AssertionError("The model should have been loaded, not trained")
+
+
+def test_key_depends_on_the_classifiers_and_features(registry):
+    key = registry.key_for(create_model())
+    assert registry.key_for(create_model()) == key
+    assert registry.key_for(create_model(n_jobs=2)) == key
+    assert registry.key_for(create_model(classifier_names=["XGBClassifier"])) != key
+    bigger = dict(SMALL_CLASSIFIERS, XGBClassifier=("xgboost", "XGBClassifier", {"n_estimators": 30, "max_depth": 3}))
+    assert registry.key_for(create_model(classifier_specs=bigger)) != key
+    model = create_model()
+    del model.hr_retention_data["Age"]
+    assert registry.key_for(model) != key
+
+
+def test_trained_model_is_loaded_instead_of_trained_again(registry):
+    model = create_model(classifier_names=["KNeighborsClassifier"])
+    registry.train(model)
+    loaded = create_model(classifier_names=["KNeighborsClassifier"])
+    loaded.train = _fail_training
+    registry.train(loaded)
+    assert (loaded.predict(model.x_test.copy()) == model.predict(model.x_test.copy())).all()
+
+
+def test_evicted_models_are_loaded_from_disk(registry):
+    knn = create_model(classifier_names=["KNeighborsClassifier"])
+    xgb = create_model(classifier_names=["XGBClassifier"])
+    registry.train(knn)
+    registry.train(xgb)
+    assert list(registry._models) == [registry.key_for(xgb)]
+
+    loaded = create_model(classifier_names=["KNeighborsClassifier"])
+    assert registry.load(loaded)
+    assert list(registry._models) == [registry.key_for(knn)]
+    assert not ModelRegistry(directory=registry.directory).load(create_model(classifier_names=["BaggingClassifier"]))
+
+
+def test_loaded_models_do_not_share_their_state(registry):
+    model = create_model(classifier_names=["KNeighborsClassifier"])
+    registry.train(model)
+    first, second = (create_model(classifier_names=["KNeighborsClassifier"]) for _ in range(2))
+    registry.load(first)
+    first.metrics["KNeighborsClassifier"]["changed"] = True
+    first.set_n_jobs(2)
+    registry.load(second)
+    assert "changed" not in second.metrics["KNeighborsClassifier"]
+    assert second.classifiers["KNeighborsClassifier"] is not first.classifiers["KNeighborsClassifier"]
+    assert second.classifiers["KNeighborsClassifier"].get_params()["n_jobs"] == 1
+
+
+def test_stored_models_have_their_deferred_evaluations(registry):
+    model = create_model(evaluation="deferred")
+    registry.train(model)
+    loaded = create_model(evaluation="deferred")
+    assert ModelRegistry(directory=registry.directory).load(loaded)
+    assert set(loaded.metrics) == set(loaded.test_scores) == set(model.classifiers)
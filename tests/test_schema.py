@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from model.schema import FeatureSchema
+from score import score_file, validate_chunk
+
+DATA = pd.DataFrame({"Age": [18, 40, 60], "MonthlyIncome": [1000.5, 5000.0, 20000.0],
+                     "Department": ["HR", "Research", "Sales"]})
+COLS = list(DATA.columns)
+
+
+@pytest.fixture
+def schema():
+    return FeatureSchema.from_data(DATA)
+
+
+@pytest.fixture
+def chunk():
+    # The employee of row 11 is too old, the one of row 12 is of an unknown department
+    return pd.DataFrame({"Age": [30, 70, 30], "MonthlyIncome": [2000.0, 2000.0, 2000.0],
+                         "Department": ["Sales", "HR", "Marketing"]}, index=[10, 11, 12])
+
+
+def test_fields_are_derived_from_the_data(schema):
+    assert schema.fields["Age"] == {"type": "int", "min": 18, "max": 60}
+    assert schema.fields["MonthlyIncome"] == {"type": "float", "min": 1000.5, "max": 20000.0}
+    assert schema.fields["Department"] == {"type": "category", "options": ["HR", "Research", "Sales"]}
+
+
+def test_check_single_values(schema):
+    assert schema.check("Age", "30")
+    assert not schema.check("Age", 30.5)
+    assert not schema.check("Age", "thirty")
+    assert not schema.check("Department", "Marketing")
+    assert schema.check_record({"Age": 70, "Department": "HR", "Other": 1}) == \
+        {"missing": ["MonthlyIncome"], "unknown": ["Other"], "invalid": ["Age"]}
+
+
+def test_validate_finds_every_invalid_value(schema, chunk):
+    errors = schema.validate(chunk, COLS)
+    assert sorted(zip(errors["row"], errors["field"])) == [(11, "Age"), (12, "Department")]
+
+
+def test_validate_finds_missing_columns(schema, chunk):
+    errors = schema.validate(chunk.drop(columns="MonthlyIncome"), COLS)
+    missing = errors[errors["error"] == "missing"]
+    assert set(missing["field"]) == {"MonthlyIncome"}
+    assert list(missing["row"]) == [10, 11, 12]
+    assert set(errors["field"]) == {"MonthlyIncome", "Age", "Department"}
+
+
+def test_score_policy_keeps_invalid_employees(schema, chunk):
+    assert list(validate_chunk(schema, COLS, chunk, "score").index) == [10, 11, 12]
+
+
+def test_skip_policy_leaves_out_invalid_employees(schema, chunk):
+    assert list(validate_chunk(schema, COLS, chunk, "skip").index) == [10]
+
+
+def test_skip_policy_leaves_out_chunks_without_valid_employees(trained_model, tmp_path):
+    employees = trained_model.hr_retention_data.iloc[:40].copy()
+    employees["Age"] = [500] * 30 + employees["Age"].iloc[30:].tolist()
+    input_path, output_path = str(tmp_path / "employees.csv"), str(tmp_path / "predictions.csv")
+    employees.to_csv(input_path, index=False)
+    schema = FeatureSchema.from_data(trained_model.hr_retention_data)
+    assert score_file(trained_model, input_path, output_path, 10, schema, "skip") == 10
+    assert len(pd.read_csv(output_path)) == 10
+
+
+@pytest.mark.parametrize("invalid", ["score", "skip", "error"])
+def test_missing_columns_stop_every_policy(schema, chunk, invalid):
+    with pytest.raises(ValueError, match="Missing columns: \\['Age'\\]"):
+        validate_chunk(schema, COLS, chunk.drop(columns="Age"), invalid)
+
+
+def test_error_policy_stops_on_invalid_employees(schema, chunk):
+    with pytest.raises(ValueError, match="2 of 3 employees are invalid"):
+        validate_chunk(schema, COLS, chunk, "error")
+    assert validate_chunk(schema, COLS, chunk.loc[[10]], "error").equals(chunk.loc[[10]])
+
+
+def test_saved_schema_validates_the_same(schema, chunk, tmp_path):
+    path = str(tmp_path / "schema.json")
+    schema.save(path)
+    assert FeatureSchema.load(path).validate(chunk, COLS).equals(schema.validate(chunk, COLS))
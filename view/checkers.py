@@ -42,9 +42,23 @@ class OptionsChecker(Checker):
     def __init__(self, options, col):
         super().__init__(col)
         self.options = options
+        self._options = frozenset(options)
 
     def check(self, option):
         """
         Check if the given option is in options
         """
-        return option in self.options
+        return option in self._options
+
+
+def create_schema_checker(col, schema):
+    """
+    Create the checker of a column by its field in a FeatureSchema, without going over the data.
+    Returns None for columns that are not numbers or categories.
+    """
+    field = schema.fields[col]
+    if field["type"] in ("int", "float"):
+        return MinMaxChecker(field["min"], field["max"], col)
+    if field["type"] == "category":
+        return OptionsChecker(field["options"], col)
+    return None
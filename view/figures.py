@@ -0,0 +1,242 @@
+import csv
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model.instrumentation import span
+
+FIGURES_CACHE_DIR = os.path.join("Plots", "cache")
+# Change when the figures are drawn differently, so figures from the cache are drawn again
+FIGURES_VERSION = 1
+OUTPUT_FORMATS = ["png", "grid", "json", "csv"]
+GRID_COLS = 3
+
+# Columns that are plotted by ranges of values instead of by every value: a value is counted in the bin of the last
+# edge that is lower than or equal to it, and values below the first edge are counted in the first bin
+BINS = {
+    "Age": {
+        "edges": [31, 40],
+        "labels": ["Age <= 30", "30 < Age < 40", "Age >= 40"]
+    },
+    "HourlyRate": {
+        "edges": [40, 50, 60, 70, 80, 90],
+        "labels": [f"{30 + i * 10} <= Hourly Rate < {30 + (i + 1) * 10}" for i in range(6)] +
+                  ["90 <= Hourly Rate <= 100"]
+    },
+    "MonthlyIncome": {
+        "edges": [5000, 10000, 15000],
+        "labels": ["1000 - 5000", "5000 - 10000", "10000 - 15000", "15000 - 20000"]
+    },
+}
+NOT_PLOTTED_COLS = ["EmployeeNumber", "DailyRate", "EmployeeCount", "MonthlyRate", "Over18"]
+
+
+def _get_pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _figure_hash(*content):
+    return hashlib.sha256(json.dumps([FIGURES_VERSION, *content]).encode()).hexdigest()
+
+
+def _save(fig, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp.png"
+    fig.savefig(tmp_path, dpi=fig.dpi)
+    os.replace(tmp_path, path)
+
+
+def render_figure(key, langs, vals, path):
+    """
+    Draw the bar plot of a column to a file
+    """
+    plt = _get_pyplot()
+    fig = plt.figure(figsize=(20, 10))
+
+    # creating the bar plot
+    plt.bar(langs, vals, color='maroon',
+            width=0.4)
+
+    plt.ylabel(f"{key} Values")
+    plt.title(key)
+
+    _save(fig, path)
+    plt.close(fig)
+    return path
+
+
+def render_grid(cols_for_plotting, path):
+    """
+    Draw the bar plots of all the columns to a single file
+    """
+    plt = _get_pyplot()
+    rows = math.ceil(len(cols_for_plotting) / GRID_COLS)
+    fig, axes = plt.subplots(rows, GRID_COLS, figsize=(8 * GRID_COLS, 4 * rows), squeeze=False)
+    for ax, (key, val) in zip(axes.flat, cols_for_plotting.items()):
+        ax.bar(val["langs"], val["vals"], color='maroon', width=0.4)
+        ax.set_title(key)
+        ax.tick_params(axis="x", labelrotation=90, labelsize=6)
+    for ax in axes.flat[len(cols_for_plotting):]:
+        ax.axis("off")
+    fig.tight_layout()
+    _save(fig, path)
+    plt.close(fig)
+    return path
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _render_missing(figures, workers):
+    """
+    Draw the figures that are not in the cache yet, in a pool of processes when there are a few of them
+    """
+    missing = [(key, val, path) for key, val, path in figures if not os.path.isfile(path)]
+    logging.info(f"Drawing {len(missing)} figures, {len(figures) - len(missing)} are cached")
+    workers = min(workers or os.cpu_count() or 1, len(missing))
+    if workers <= 1:
+        for key, val, path in missing:
+            with span("render_figure", column=key):
+                render_figure(key, val["langs"], val["vals"], path)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with span("render_figures"), ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(render_figure, key, list(val["langs"]), list(val["vals"]), path)
+                   for key, val, path in missing]
+        for future in futures:
+            future.result()
+
+
+def save_counts(cols_for_plotting, path, output_format):
+    """
+    Save the values of the columns as JSON or as CSV
+    """
+    if output_format == "json":
+        with open(path, "w") as f:
+            json.dump(cols_for_plotting, f, indent=2)
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Column", "Value", "Count"])
+            for key, val in cols_for_plotting.items():
+                for lang, count in zip(val["langs"], val["vals"]):
+                    writer.writerow([key, lang, count])
+
+
+def save_figures(cols_for_plotting, directory, output_format="png", workers=None, cache_dir=FIGURES_CACHE_DIR):
+    """
+    Save cols values in files as graphs.
+    output_format is "png" for a graph per column, "grid" for all the graphs in a single image,
+    or "json"/"csv" for only the values. Graphs are kept in cache_dir by their values,
+    and graphs that were already drawn are linked to the directory instead of being drawn again.
+    workers is the number of processes to draw with (all the cores by default).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', should be one of: {OUTPUT_FORMATS}")
+    for path in (directory, cache_dir):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    if output_format in ("json", "csv"):
+        save_counts(cols_for_plotting, os.path.join(directory, f"counts.{output_format}"), output_format)
+        return
+
+    if output_format == "grid":
+        cached_path = os.path.join(cache_dir, f"{_figure_hash('grid', cols_for_plotting)}.png")
+        if not os.path.isfile(cached_path):
+            with span("render_grid"):
+                render_grid(cols_for_plotting, cached_path)
+        _link_or_copy(cached_path, os.path.join(directory, "grid.png"))
+        return
+
+    figures = [(key, val, os.path.join(cache_dir, f"{_figure_hash(key, val)}.png"))
+               for key, val in cols_for_plotting.items()]
+    _render_missing(figures, workers)
+    with span("write_figures"):
+        for key, _, cached_path in figures:
+            logging.info(f"Saving figure: {key}")
+            _link_or_copy(cached_path, os.path.join(directory, f"{key}.png"))
+
+
+def get_bin_indexes(col, values):
+    """
+    Get the indexes of the bins of values of a column in BINS
+    """
+    return np.digitize(values, BINS[col]["edges"])
+
+
+def count_values(values, options):
+    """
+    Count how many times every option (of sorted options) is in values
+    """
+    return np.bincount(np.searchsorted(options, values), minlength=len(options))
+
+
+def get_cols_for_plotting(model, predictions):
+    """
+    Count the values of every column for the employees that are predicted to leave,
+    and count the predictions themselves in the Attrition column
+    """
+    leaving = np.asarray(predictions).astype(bool)
+    leaving_x = model.x_test[leaving]
+    cols_for_plotting = {}
+
+    for col, col_bins in BINS.items():
+        vals = [0] * len(col_bins["labels"])
+        if col in leaving_x.columns:
+            vals = np.bincount(get_bin_indexes(col, leaving_x[col].to_numpy()), minlength=len(vals)).tolist()
+        cols_for_plotting[col] = {
+            "langs": col_bins["labels"],
+            "vals": vals
+        }
+
+    for col in model.hr_retention_data.columns:
+        if col in NOT_PLOTTED_COLS or col in BINS:
+            continue
+
+        if col in model.encoder:
+            langs = model.encoder.categories[col]
+            options = np.arange(len(langs))
+        else:
+            options = np.unique(model.hr_retention_data[col].to_numpy())
+            langs = [str(val) for val in options]
+
+        if col == "Attrition":
+            values = predictions
+        elif col in leaving_x.columns:
+            values = leaving_x[col].to_numpy()
+        else:
+            values = []
+        cols_for_plotting[col] = {
+            "langs": langs,
+            "vals": count_values(values, options).tolist()
+        }
+    return cols_for_plotting
+
+
+def visualize_classifier(model, directory, output_format="png", cache_dir=FIGURES_CACHE_DIR):
+    """
+    Visualize a model (see save_figures for the output formats)
+    """
+    with span("visualize_classifier"):
+        predictions = model.predict(model.x_test)
+        with span("count_values"):
+            cols_for_plotting = get_cols_for_plotting(model, predictions)
+        save_figures(cols_for_plotting, directory, output_format, cache_dir=cache_dir)
+    return predictions
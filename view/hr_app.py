@@ -1,171 +1,30 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List
 
 import PySimpleGUI as sg
 
-import pyautogui
-
 import os
 import numpy as np
 
-from model import HREmployeeAttritionModel
-import matplotlib.pyplot as plt
-
-from view.checkers import MinMaxChecker, OptionsChecker, Checker
-from view.timer import open_timer
-
-plt.ioff()
-sg.theme('DarkGrey6')
-
-cols_for_plotting = {
-    "Age": {
-        "langs": ["Age <= 30", "30 < Age < 40", "Age >= 40"],
-        "vals": [0] * 3
-    },
-    "HourlyRate": {
-        "langs": [f"{30 + i * 10} <= Hourly Rate < {30 + (i + 1) * 10}" for i in range(6)] +
-                 ["90 <= Hourly Rate <= 100"],
-        "vals": [0] * 7
-    },
-    "MonthlyIncome": {
-        "langs": ["1000 - 5000", "5000 - 10000", "10000 - 15000", "15000 - 20000"],
-        "vals": [0] * 4
-    },
-}
-
-
-def get_age_index_to_inc(age):
-    """
-    Get index for an age
-    """
-    if age <= 30:
-        return 0
-    elif 30 < age < 40:
-        return 1
-    else:
-        return 2
-
-
-def get_monthly_index_to_inc(monthly_income):
-    """
-    Get index for a monthly income
-    """
-    if 1000 <= monthly_income < 5000:
-        return 1
-    elif 5000 <= monthly_income < 10000:
-        return 2
-    elif 10000 <= monthly_income < 15000:
-        return 3
-    else:
-        return 4
-
-
-def get_hourly_rate_index_to_inc(hourly_rate):
-    """
-    Get index for hourly rate
-    """
-    if 30 <= hourly_rate < 40:
-        return 0
-    if 40 <= hourly_rate < 50:
-        return 1
-    if 50 <= hourly_rate < 60:
-        return 2
-    if 60 <= hourly_rate < 70:
-        return 3
-    if 70 <= hourly_rate < 80:
-        return 4
-    if 80 <= hourly_rate < 90:
-        return 5
-    else:
-        return 6
-
-
-def save_figures(cols_for_plotting, directory):
-    """
-    Save cols values in files as graphs
-    """
-    if not os.path.isdir(directory):
-        os.makedirs(directory)
-
-    for key, val in cols_for_plotting.items():
-        logging.info(f"Saving figure: {key}")
-        fig = plt.figure(figsize=(20, 10))
-
-        # creating the bar plot
-        plt.bar(val["langs"], val["vals"], color='maroon',
-                width=0.4)
-
-        plt.ylabel(f"{key} Values")
-        plt.title(key)
-
-        fig.savefig(os.path.join(directory, f"{key}.png"), dpi=fig.dpi)
-        plt.close()
-
-
-def visualize_classifier(model, directory):
-    """
-    Visualize a model
-    """
-    predictions = model.predict(model.x_test)
-    mistakes = []
-    not_needed_to_add = ["EmployeeNumber", "Age", "DailyRate", "EmployeeCount", "MonthlyRate", "Over18",
-                         "MonthlyIncome"]
-
-    for col in model.hr_retention_data.columns:
-        if col not in not_needed_to_add:
-            langs = list(set(model.hr_retention_data[col].tolist()))
-            langs.sort()
-            langs = [str(val) for val in langs]
-
-            cols_for_plotting[col] = {
-                "langs": langs,
-                "vals": [0] * len(langs)
-            }
-
-    already_added = ["Age", "MonthlyIncome", "HourlyRate", "Attrition"]
-
-    for attrition, x, y in zip(predictions, model.x_test.values, model.y_test.values):
-        if attrition != y:
-            mistakes.append(x)
-        if attrition:
-
-            if "Age" in model.COLS_INDEXES:
-                age = x[0]
-                age_index_to_inc = get_age_index_to_inc(age)
-                cols_for_plotting["Age"]["vals"][age_index_to_inc] += 1
-
-            if "MonthlyIncome" in model.COLS_INDEXES:
-                monthly_income_index = model.COLS_INDEXES["MonthlyIncome"]
-                monthly_income = x[monthly_income_index]
-                monthly_index_to_inc = get_monthly_index_to_inc(monthly_income) - 1
-                cols_for_plotting["MonthlyIncome"]["vals"][monthly_index_to_inc] += 1
-
-            if "HourlyRate" in model.COLS_INDEXES:
-                hourly_rate_index = model.COLS_INDEXES["HourlyRate"]
-                hourly_rate = x[hourly_rate_index]
-                hourly_rate_index_to_inc = get_hourly_rate_index_to_inc(hourly_rate)
-                cols_for_plotting["HourlyRate"]["vals"][hourly_rate_index_to_inc] += 1
-
-            for col, index in model.COLS_INDEXES.items():
-                if col in already_added or col not in cols_for_plotting:
-                    continue
-
-                val = cols_for_plotting[col]
-
-                option = x[index]
-                if option in model.reversed_mappings[col]:
-                    orig_op = model.reversed_mappings[col][option]
-                else:
-                    orig_op = str(option)
-                index_to_inc = val["langs"].index(orig_op)
-                val["vals"][index_to_inc] += 1
+from model import HREmployeeAttritionModel, UNUSED_COLS, DATA_PATH
+from model.attribution import top_features
+from model.instrumentation import span
+from model.partial import QueryLog, get_partial_model
+from model.registry import ModelRegistry
+from model.schema import get_schema
 
-        val = cols_for_plotting["Attrition"]
-        val["vals"][attrition] += 1
+from view.checkers import MinMaxChecker, Checker, create_schema_checker
+from view.figures import visualize_classifier, get_bin_indexes
 
-    save_figures(cols_for_plotting, directory)
-    return predictions
+PROGRESS_EVENT = "-PROGRESS-"
+DONE_EVENT = "-DONE-"
+STATUS_KEY = "-STATUS-"
+# Number of features shown to the user as the reasons of the result
+TOP_REASONS = 5
 
 
 def values_are_valid(values, checkers: List[Checker]):
@@ -175,7 +34,7 @@ def values_are_valid(values, checkers: List[Checker]):
     not_valid_vals = []
     for val, checker in zip(values, checkers):
         if val:
-            logging.info(f"Checking '{checker.col}' value: {val}")
+            logging.debug(f"Checking '{checker.col}' value: {val}")
             if not checker.check(val):
                 logging.warning(f"'{checker.col}' value '{val}' is not valid")
                 not_valid_vals.append([checker.col, val])
@@ -191,16 +50,91 @@ def values_are_valid(values, checkers: List[Checker]):
     return True
 
 
+class RequestCancelled(Exception):
+    """
+    Raised in a request that was cancelled by the user
+    """
+    pass
+
+
+def run_request(window, registry, query_log, model, vals, cancel_event):
+    """
+    Train, visualize and predict for the user's values, runs in the background and reports its progress to
+    the window. The model is trained over all the features once, and the values the user left blank are predicted
+    without training (see get_partial_model). Returns the result, its confidence and the features that pushed
+    it toward quitting the most.
+    """
+    def progress(message):
+        if cancel_event.is_set():
+            raise RequestCancelled()
+        logging.info(message)
+        window.write_event_value(PROGRESS_EVENT, message)
+
+    model.progress = progress
+
+    with span("request"):
+        # Train model
+        progress("Training model with monthly income...")
+        registry.train(model)
+
+        # Predict On Test
+        now = datetime.now().strftime("%H_%M_%S_%f")
+        result_dir = os.path.join("Plots", now)
+
+        # Visualize and save figures
+        progress("Visualizing model with monthly income...")
+        visualize_classifier(model, result_dir)
+
+        progress("Predicting your values!!!")
+        query_log.record([col for col in model.x_cols if col not in vals])
+        predicting_model, vals = get_partial_model(registry, model, vals)
+        vals = predicting_model.fit_data(vals)
+        vals = np.asarray([vals])
+        results, confidences = predicting_model.predict_with_confidence(vals)
+        attributions = predicting_model.explain(vals)
+        reasons = top_features(attributions["ensemble"].iloc[0], TOP_REASONS) if attributions else []
+    return results[0], confidences[0], reasons
+
+
+def get_result_message(result, confidence, reasons, name, monthly_income_entered_val, job_sat_entered_val,
+                       monthly_income_importance, job_sat_importance):
+    """
+    Get the message to show the user for a result
+    """
+    sat_msg = "Your overall satisfaction from the current job was not calculated"
+    if job_sat_entered_val and monthly_income_entered_val:
+        if monthly_income_importance and job_sat_importance:
+            monthly_income_importance = int(monthly_income_importance)
+            job_sat_importance = int(job_sat_importance)
+            monthly_income_entered_val = get_bin_indexes("MonthlyIncome", [monthly_income_entered_val])[0] + 1
+            your_overall_satisfaction = monthly_income_entered_val * monthly_income_importance + \
+                                        job_sat_entered_val * job_sat_importance
+            your_overall_satisfaction = 4 * (your_overall_satisfaction - 2) / 38 + 1
+            sat_msg = f"Your overall satisfaction from your current job is: {your_overall_satisfaction}"
+
+    if result:
+        msg = f"{name} it is best that you quit your job..."
+    else:
+        msg = f"{name} you shouldn't quit your job!"
+    msg += f" (confidence: {confidence:.0%})"
+    if reasons:
+        msg += "\nWhat pushed you toward quitting the most: " + \
+               ", ".join(f"{col} (+{attribution:.0%})" for col, attribution in reasons)
+    return msg + "\n" + sat_msg
+
+
 def open_gui():
     """
     Opens the GUI for the app
     """
+    import pyautogui
+
+    sg.theme('DarkGrey6')
     vals = {}
-    model_with_monthly_income = HREmployeeAttritionModel()
-    del model_with_monthly_income.hr_retention_data["EmployeeNumber"]
-    del model_with_monthly_income.hr_retention_data["EmployeeCount"]
-    del model_with_monthly_income.hr_retention_data["Over18"]
-    features = [col for col in model_with_monthly_income.hr_retention_data.columns if col != "Attrition"]
+    registry = ModelRegistry()
+    query_log = QueryLog()
+    schema = get_schema(DATA_PATH)
+    features = [col for col in schema.fields if col != "Attrition" and col not in UNUSED_COLS]
     width, height = pyautogui.size()
 
     cols = []
@@ -210,20 +144,11 @@ def open_gui():
         if feature == "Attrition":
             continue
 
-        langs = list(set(model_with_monthly_income.hr_retention_data[feature].tolist()))
-        langs.sort()
-        is_bool = False
-
-        if type(langs[0]) == int or type(langs[0]) == float:
-            min_val, max_val = min(langs), max(langs)
-            checkers.append(MinMaxChecker(min_val, max_val, feature))
-            options = f"{min_val} - {max_val}"
-        elif type(langs[0]) == str:
-            options = ", ".join(langs)
-            checkers.append(OptionsChecker(langs, feature))
-        else:
-            is_bool = True
-            options = "false / true"
+        checker = create_schema_checker(feature, schema)
+        is_bool = checker is None
+        if checker:
+            checkers.append(checker)
+        options = schema.describe(feature)
 
         is_bool_dict[feature] = is_bool
         cols += [f"{feature} ({options})"]
@@ -249,27 +174,61 @@ def open_gui():
     job_sat_importance_key = 33
     checkers.append(MinMaxChecker(min_val=1, max_val=5, col="MonthlyIncomeImportance"))
     checkers.append(MinMaxChecker(min_val=1, max_val=5, col="JobSatisfactionImportance"))
-    layout += [[sg.Button('Submit', font=('Helvetica', 12))]]
+    layout += [[sg.Button('Submit', font=('Helvetica', 12)),
+                sg.Button('Cancel', font=('Helvetica', 12), disabled=True),
+                sg.Text("", key=STATUS_KEY, size=(80, 1), font=('Helvetica', 12))]]
     layout = [[sg.Column(layout, scrollable=True, key="Column2", size=(width, height * 0.9))]]
     # Create the window
     window = sg.Window("HR App", layout, finalize=True)
     window.Maximize()
 
+    executor = ThreadPoolExecutor(max_workers=1)
+    cancel_event = threading.Event()
+    request = None
+
     while True:
         try:
-            # Display and interact with the Window
-            event, values = window.read()
-
-            model_with_monthly_income = HREmployeeAttritionModel()
-            vals = {}
-            del model_with_monthly_income.hr_retention_data["EmployeeNumber"]
-            del model_with_monthly_income.hr_retention_data["EmployeeCount"]
-            del model_with_monthly_income.hr_retention_data["Over18"]
-            features = [col for col in model_with_monthly_income.hr_retention_data.columns if col != "Attrition"]
+            # Display and interact with the Window, while a request is running the elapsed time is updated every second
+            event, values = window.read(timeout=1000 if request else None)
 
             if event == "Exit" or event == sg.WIN_CLOSED:
                 break
 
+            if request and event in (sg.TIMEOUT_EVENT, PROGRESS_EVENT):
+                if event == PROGRESS_EVENT:
+                    request["status"] = values[PROGRESS_EVENT]
+                window[STATUS_KEY].update(f"{request['status']} ({time.perf_counter() - request['start']:.0f}s)")
+                continue
+
+            if event == "Cancel":
+                logging.info("Cancelling the request...")
+                cancel_event.set()
+                window[STATUS_KEY].update("Cancelling...")
+                continue
+
+            if event == DONE_EVENT:
+                window["Submit"].update(disabled=False)
+                window["Cancel"].update(disabled=True)
+                window[STATUS_KEY].update("")
+                message_args = request["message_args"]
+                request = None
+                try:
+                    result, confidence, reasons = values[DONE_EVENT].result()
+                except RequestCancelled:
+                    logging.info("The request was cancelled")
+                    continue
+                sg.popup(get_result_message(result, confidence, reasons, *message_args), title="HR Result")
+                continue
+
+            if event != "Submit" or request:
+                continue
+
+            model_with_monthly_income = HREmployeeAttritionModel(n_jobs=-1)
+            vals = {}
+            for col in UNUSED_COLS:
+                del model_with_monthly_income.hr_retention_data[col]
+            features = [col for col in model_with_monthly_income.hr_retention_data.columns if col != "Attrition"]
+
             # Do something with the information gathered
             if values:
                 monthly_income_entered_val = None
@@ -277,79 +236,38 @@ def open_gui():
                 if not values_are_valid(list(values.values())[1:], checkers):
                     continue
 
-                timer_proc = open_timer()
-                closed_timer = False
-                try:
-                    for i, feature in zip(range(len(values)), features):
-                        val = values[i + 1]
-                        if val:
-                            if feature == "MonthlyIncome":
-                                monthly_income_entered_val = int(val)
-                            if feature == "JobSatisfaction":
-                                job_sat_entered_val = int(val)
-                            if is_bool_dict[feature]:
-                                val = bool(val)
-                                if val:
-                                    val = 1
-                                else:
-                                    val = 0
-                            vals[feature] = val
-                        else:
-                            del model_with_monthly_income.hr_retention_data[feature]
-
-                    # Train model
-                    logging.info("Training model with monthly income...")
-                    model_with_monthly_income.train()
-                    logging.info("Done!")
-
-                    # Predict On Test
-                    now = datetime.now().strftime("%H_%M_%S_%f")
-                    result_dir = os.path.join("Plots", now)
-
-                    # Visualize and save figures
-                    logging.info("Visualizing model with monthly income...")
-                    predictions_with_monthly_income = visualize_classifier(model_with_monthly_income, result_dir)
-                    logging.info("Done!")
-
-                    logging.info("Predicting your values!!!")
-                    vals = model_with_monthly_income.fit_data(vals)
-                    vals = np.asarray([vals])
-                    result = model_with_monthly_income.predict(vals)[0]
-                    sat_msg = "Your overall satisfaction from the current job was not calculated"
-                    if job_sat_entered_val and monthly_income_entered_val:
-                        monthly_income_importance = values[monthly_income_importance_key]
-                        job_sat_importance = values[job_sat_importance_key]
-                        if monthly_income_importance and job_sat_importance:
-                            monthly_income_importance = int(monthly_income_importance)
-                            job_sat_importance = int(job_sat_importance)
-                            monthly_income_entered_val = get_monthly_index_to_inc(monthly_income_entered_val)
-                            your_overall_satisfaction = monthly_income_entered_val * monthly_income_importance + \
-                                                        job_sat_entered_val * job_sat_importance
-                            your_overall_satisfaction = 4 * (your_overall_satisfaction - 2) / 38 + 1
-                            sat_msg = f"Your overall satisfaction from your current job is: {your_overall_satisfaction}"
-
-                    if result:
-                        import psutil
-                        p = psutil.Process(timer_proc.pid)
-                        p.terminate()
-                        msg = f"{values[0]} it is best that you quit your job..."
-                    else:
-                        import psutil
-                        p = psutil.Process(timer_proc.pid)
-                        p.terminate()
-                        msg = f"{values[0]} you shouldn't quit your job!"
-                    sg.popup(msg + "\n" + sat_msg, title="HR Result")
-                    closed_timer = True
-                finally:
-                    if not closed_timer:
-                        import psutil
-                        p = psutil.Process(timer_proc.pid)
-                        p.terminate()
+                for i, feature in zip(range(len(values)), features):
+                    val = values[i + 1]
+                    if val:
+                        if feature == "MonthlyIncome":
+                            monthly_income_entered_val = int(val)
+                        if feature == "JobSatisfaction":
+                            job_sat_entered_val = int(val)
+                        if is_bool_dict[feature]:
+                            val = bool(val)
+                            if val:
+                                val = 1
+                            else:
+                                val = 0
+                        vals[feature] = val
+
+                cancel_event.clear()
+                future = executor.submit(run_request, window, registry, query_log, model_with_monthly_income, vals,
+                                         cancel_event)
+                # Only the request holds the model, so it is freed as soon as the request is done
+                del model_with_monthly_income
+                future.add_done_callback(lambda done: window.write_event_value(DONE_EVENT, done))
+                request = {"start": time.perf_counter(), "status": "Starting...",
+                           "message_args": (values[0], monthly_income_entered_val, job_sat_entered_val,
+                                            values[monthly_income_importance_key], values[job_sat_importance_key])}
+                window["Submit"].update(disabled=True)
+                window["Cancel"].update(disabled=False)
         except Exception as e:
             import traceback
             logging.info(traceback.format_exc())
             sg.popup(f"There was a failure: {e}", title="Failure!")
 
-
+    cancel_event.set()
+    executor.shutdown(wait=False)
     # Finish up by removing from the screen
     window.close()